@@ -0,0 +1,532 @@
+"""Batch review jobs for whole submission sets.
+
+A job takes a zip file or directory of .pdf/.docx papers, extracts them in
+parallel, condenses papers too long to send whole into a map-reduce digest,
+and reviews every (paper x PROMPTS entry) pair, either through the OpenAI
+Batch API (split into files within its size and request limits) or through a
+local, rate-limited concurrent runner. Job
+state lives in BATCH_DIR/<job_id>/job.json, so jobs can be polled and are
+resumed after a restart. The output is a single results.jsonl with one line
+per paper, named by its path inside the zip file or directory.
+
+Only successful reviews are recorded as done. A job whose reviews all
+succeeded ends "completed"; with some failures it ends "partial" (or
+"failed" if none succeeded), and `resume --retry-failed` runs just the
+missing reviews again.
+
+    python batch_jobs.py submit papers.zip --mode openai
+    python batch_jobs.py status <job_id>
+    python batch_jobs.py resume [--retry-failed]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+import uuid
+import zipfile
+
+from chunking import prepare_review_content
+from extraction import EXTRACTION_WORKERS, iter_docx_paragraphs, iter_pdf_paragraphs, process_pool
+from prompt_assembly import build_messages
+from review_cache import sha256_hex
+
+BATCH_DIR = os.getenv("BATCH_DIR", "batch_jobs")
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", 30))
+BATCH_REQUESTS_PER_MINUTE = float(os.getenv("BATCH_REQUESTS_PER_MINUTE", 60))
+# In-flight API calls of the local runner and the digests, separate from REVIEW_CONCURRENCY.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 2))
+# Batch API input files are limited to 50,000 requests and 200 MB; stay a little under the size cap.
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 50000))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", 190 * 1024 * 1024))
+
+SUPPORTED_SUFFIXES = (".pdf", ".docx")
+FINISHED = ("completed", "partial", "failed")
+OPENAI_TERMINAL = ("completed", "failed", "expired", "cancelled")
+
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` acquisitions per minute, with bursts up to `burst`."""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _extract_paper(path):
+    # Runs inside a worker process, so page-level parallelism is disabled here.
+    if path.endswith(".pdf"):
+        paragraphs = iter_pdf_paragraphs(path, workers=1)
+    else:
+        paragraphs = iter_docx_paragraphs(path)
+    return "\n\n".join(paragraphs)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_jsonl(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class BatchManager:
+    """Create, run, resume and report batch jobs.
+
+    `client` is an `openai.AsyncOpenAI` (pointed at `mock_openai` in tests)
+    and `engine` the `ReviewEngine` used by the local runner and for the
+    map-reduce digests of papers too long to send whole (see chunking.py).
+    Give it an engine of its own, with `concurrency=BATCH_CONCURRENCY`, so a
+    submission set does not queue ahead of interactive reviews. Every call it
+    makes goes through the `requests_per_minute` limiter.
+    """
+
+    def __init__(self, client, engine, prompts, digest_prompt, directory=BATCH_DIR,
+                 poll_interval=BATCH_POLL_INTERVAL, requests_per_minute=BATCH_REQUESTS_PER_MINUTE):
+        self.client = client
+        self.engine = engine
+        self.prompts = prompts
+        self.digest_prompt = digest_prompt
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.limiter = RateLimiter(requests_per_minute)
+        self._tasks = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
+
+    def _path(self, job_id, name):
+        return os.path.join(self._job_dir(job_id), name)
+
+    def load(self, job_id):
+        path = self._path(job_id, "job.json")
+        if not os.path.basename(job_id) == job_id or not os.path.exists(path):
+            raise KeyError(f"Unknown batch job: {job_id}")
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, job):
+        job["updated_at"] = time.time()
+        _write_json(self._path(job["id"], "job.json"), job)
+
+    def create_job(self, source, mode="local"):
+        """Register a job from a zip file or a directory of papers and return it."""
+        if mode not in ("local", "openai"):
+            raise ValueError("Batch mode must be 'local' or 'openai'.")
+        job_id = uuid.uuid4().hex
+        papers_dir = self._path(job_id, "papers")
+        os.makedirs(papers_dir)
+
+        names = []
+        if zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                members = [m for m in archive.infolist()
+                           if not m.is_dir() and m.filename.lower().endswith(SUPPORTED_SUFFIXES)
+                           and not os.path.basename(m.filename).startswith(".")]
+                for member in members:
+                    names.append(self._copy_paper(papers_dir, len(names), member.filename.lstrip("/"),
+                                                  lambda dst, m=member: shutil.copyfileobj(archive.open(m), dst)))
+        elif os.path.isdir(source):
+            for root, _, filenames in sorted(os.walk(source)):
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(SUPPORTED_SUFFIXES) and not filename.startswith("."):
+                        path = os.path.join(root, filename)
+                        relative = os.path.relpath(path, source).replace(os.sep, "/")
+                        with open(path, "rb") as src:
+                            names.append(self._copy_paper(papers_dir, len(names), relative,
+                                                          lambda dst, s=src: shutil.copyfileobj(s, dst)))
+        else:
+            shutil.rmtree(self._job_dir(job_id))
+            raise ValueError("Batch source must be a zip file or a directory.")
+
+        if not names:
+            shutil.rmtree(self._job_dir(job_id))
+            raise ValueError("No .pdf or .docx files found in the batch source.")
+
+        job = {
+            "id": job_id, "mode": mode, "status": "extracting", "created_at": time.time(),
+            "papers": names, "criteria": list(self.prompts), "model": self.engine.model, "extracted": False,
+            "total_requests": len(names) * len(self.prompts), "completed_requests": 0, "failed_requests": 0,
+            "openai": {}, "error": None,
+        }
+        self.save(job)
+        return job
+
+    @staticmethod
+    def _copy_paper(papers_dir, index, filename, copy):
+        """Copy one paper in as `p<index><suffix>`; `filename` is its path inside the submission set."""
+        paper_id = f"p{index:05d}"
+        suffix = os.path.splitext(filename)[1].lower()
+        with open(os.path.join(papers_dir, f"{paper_id}{suffix}"), "wb") as dst:
+            copy(dst)
+        return {"id": paper_id, "filename": filename, "suffix": suffix}
+
+    def start(self, job_id):
+        """Run the job in the background unless it is already running."""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            self._tasks[job_id] = asyncio.create_task(self.run(job_id))
+        return self._tasks[job_id]
+
+    def resume_all(self, retry_failed=False):
+        """Restart every unfinished job found on disk and return their tasks.
+
+        With `retry_failed`, "partial" and "failed" jobs are restarted too and
+        run only the reviews that have not succeeded yet.
+        """
+        tasks = []
+        restart = ("partial", "failed") if retry_failed else ()
+        for job_id in sorted(os.listdir(self.directory)):
+            if not os.path.exists(self._path(job_id, "job.json")):
+                continue
+            status = self.load(job_id)["status"]
+            if status not in FINISHED or status in restart:
+                print(f"Resuming batch job {job_id}")
+                tasks.append(self.start(job_id))
+        return tasks
+
+    async def run(self, job_id):
+        job = self.load(job_id)
+        try:
+            if not job.get("extracted", job["status"] != "extracting"):
+                await self._extract(job)
+            if job["status"] in FINISHED:
+                job["status"] = "running"
+                job["error"] = None
+                self.save(job)
+            await self._prepare(job)
+            if job["mode"] == "openai":
+                await self._run_openai_batch(job)
+            else:
+                await self._run_local(job)
+            self._write_results(job)
+            self._count(job)
+            if job["failed_requests"]:
+                job["status"] = "partial" if job["completed_requests"] else "failed"
+                job["error"] = f"{job['failed_requests']} of {job['total_requests']} reviews failed"
+            else:
+                job["status"] = "completed"
+            print(f"Batch job {job_id} {job['status']}")
+        except Exception as e:
+            print(f"Error in batch job {job_id}: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        self.save(job)
+
+    def _done(self, job):
+        """custom_ids of the reviews that have succeeded so far."""
+        return {row["custom_id"] for row in _read_jsonl(self._path(job["id"], "partial.jsonl"))}
+
+    def _count(self, job, failed=None):
+        """Set the progress counters from partial.jsonl.
+
+        Without `failed`, every review that has not succeeded counts as failed;
+        otherwise `failed` plus the reviews of papers whose extraction failed.
+        """
+        job["completed_requests"] = len(self._done(job))
+        if failed is None:
+            failed = job["total_requests"] - job["completed_requests"]
+        else:
+            failed += sum(len(job["criteria"]) for paper in job["papers"] if paper.get("error"))
+        job["failed_requests"] = failed
+
+    async def _extract(self, job):
+        loop = asyncio.get_running_loop()
+        texts_dir = self._path(job["id"], "texts")
+        os.makedirs(texts_dir, exist_ok=True)
+        pending = [paper for paper in job["papers"]
+                   if not os.path.exists(os.path.join(texts_dir, f"{paper['id']}.txt"))]
+
+        # Share the server's extraction pool, keeping at most one paper per worker queued so
+        # interactive uploads are not stuck behind a whole submission set.
+        pool = process_pool()
+        window = asyncio.Semaphore(EXTRACTION_WORKERS)
+
+        async def one(paper):
+            path = self._path(job["id"], os.path.join("papers", f"{paper['id']}{paper['suffix']}"))
+            async with window:
+                try:
+                    text = await loop.run_in_executor(pool, _extract_paper, path)
+                except Exception as e:
+                    paper["error"] = f"Extraction failed: {e}"
+                    text = ""
+            with open(os.path.join(texts_dir, f"{paper['id']}.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+
+        await asyncio.gather(*(one(paper) for paper in pending))
+
+        job["status"] = "running"
+        job["extracted"] = True
+        self.save(job)
+
+    def _text(self, job, paper, kind="texts"):
+        with open(self._path(job["id"], os.path.join(kind, f"{paper['id']}.txt")), encoding="utf-8") as f:
+            return f.read()
+
+    def _content(self, job, paper):
+        """What the criterion prompts are sent with: the full text, or a digest for long papers."""
+        return self._text(job, paper, "contents")
+
+    async def _prepare(self, job):
+        """Budget every paper like /generate-response/ does, condensing long ones into a digest.
+
+        Papers whose digest failed are retried on the next run.
+        """
+        contents_dir = self._path(job["id"], "contents")
+        os.makedirs(contents_dir, exist_ok=True)
+
+        async def one(paper):
+            path = os.path.join(contents_dir, f"{paper['id']}.txt")
+            if os.path.exists(path) or (paper.get("error") and paper.get("failed_stage") != "condense"):
+                return
+            text = self._text(job, paper)
+            try:
+                content, info = await prepare_review_content(self.engine, text.split("\n\n"), text,
+                                                             self.digest_prompt, doc_hash=sha256_hex(text),
+                                                             limiter=self.limiter)
+            except Exception as e:
+                paper["error"] = f"Condensing failed: {e}"
+                paper["failed_stage"] = "condense"
+                return
+            paper.pop("error", None)
+            paper.pop("failed_stage", None)
+            paper["review_mode"] = info["mode"]
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+        await asyncio.gather(*(one(paper) for paper in job["papers"]))
+        self.save(job)
+
+    def _requests(self, job, done=()):
+        """Yield (custom_id, paper, criterion) for every review the job still needs."""
+        for paper in job["papers"]:
+            if paper.get("error"):
+                continue
+            for criterion in job["criteria"]:
+                custom_id = f"{paper['id']}::{criterion}"
+                if custom_id not in done:
+                    yield custom_id, paper, criterion
+
+    async def _run_local(self, job):
+        partial_path = self._path(job["id"], "partial.jsonl")
+        done = self._done(job)
+        texts = {}
+        lock = asyncio.Lock()
+        self._count(job, failed=0)
+        self.save(job)
+
+        async def one(custom_id, paper, criterion):
+            if paper["id"] not in texts:
+                texts[paper["id"]] = self._content(job, paper)
+            await self.limiter.acquire()
+            content = await self.engine.review(texts[paper["id"]], self.prompts[criterion], criterion=criterion)
+            async with lock:
+                if content is None:
+                    job["failed_requests"] += 1
+                else:
+                    with open(partial_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps({"custom_id": custom_id, "content": content}, ensure_ascii=False) + "\n")
+                    job["completed_requests"] += 1
+                self.save(job)
+
+        await asyncio.gather(*(one(*request) for request in self._requests(job, done)))
+
+    async def _run_openai_batch(self, job):
+        state = job["openai"]
+        shards = state.get("shards")
+        if not shards or all(shard.get("collected") for shard in shards):
+            # First round, or a retry: submit the reviews that have not succeeded yet.
+            shards = state["shards"] = self._write_shards(job, state.get("round", 0) + 1)
+            state["round"] = state.get("round", 0) + 1
+            self.save(job)
+            if not shards:
+                return
+
+        for shard in shards:
+            if shard.get("collected"):
+                continue
+            if not shard.get("input_file_id"):
+                with open(shard["path"], "rb") as f:
+                    uploaded = await self.client.files.create(file=(os.path.basename(shard["path"]), f),
+                                                              purpose="batch")
+                shard["input_file_id"] = uploaded.id
+                self.save(job)
+            if not shard.get("batch_id"):
+                batch = await self.client.batches.create(
+                    input_file_id=shard["input_file_id"],
+                    endpoint="/v1/chat/completions",
+                    completion_window="24h",
+                    metadata={"job_id": job["id"]},
+                )
+                shard["batch_id"] = batch.id
+                self.save(job)
+
+        unfinished = []
+        for shard in shards:
+            if shard.get("collected"):
+                continue
+            while True:
+                batch = await self.client.batches.retrieve(shard["batch_id"])
+                shard["status"] = batch.status
+                shard["counts"] = batch.request_counts.model_dump() if batch.request_counts is not None else None
+                self._count_batches(job, shards)
+                self.save(job)
+                if batch.status in OPENAI_TERMINAL:
+                    break
+                await asyncio.sleep(self.poll_interval)
+            await self._collect(job, batch)
+            shard["collected"] = True
+            self.save(job)
+            if batch.status != "completed":
+                unfinished.append(f"{batch.id} ({batch.status})")
+
+        if unfinished:
+            raise RuntimeError(f"OpenAI batches did not complete: {', '.join(unfinished)}")
+
+    def _write_shards(self, job, round_number):
+        """Write the pending requests as JSONL files within the Batch API's per-file limits."""
+        shards = []
+        f = None
+        count = size = 0
+        try:
+            for custom_id, paper, criterion in self._requests(job, self._done(job)):
+                line = (json.dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": self.engine.model,
+                        "temperature": self.engine.temperature,
+                        "messages": build_messages(self._content(job, paper), self.prompts[criterion]),
+                    },
+                }, ensure_ascii=False) + "\n").encode("utf-8")
+                if f is None or count >= BATCH_MAX_REQUESTS or size + len(line) > BATCH_MAX_FILE_BYTES:
+                    if f is not None:
+                        f.close()
+                    path = self._path(job["id"], f"requests-{round_number}-{len(shards):03d}.jsonl")
+                    shards.append({"path": path})
+                    f = open(path, "wb")
+                    count = size = 0
+                f.write(line)
+                count += 1
+                size += len(line)
+        finally:
+            if f is not None:
+                f.close()
+        return shards
+
+    def _count_batches(self, job, shards):
+        """Progress while batches run: recorded successes plus the live counts of uncollected shards."""
+        counts = [shard["counts"] for shard in shards if not shard.get("collected") and shard.get("counts")]
+        self._count(job, failed=sum(c["failed"] for c in counts))
+        job["completed_requests"] += sum(c["completed"] for c in counts)
+
+    async def _collect(self, job, batch):
+        """Append the successful rows of a finished batch to partial.jsonl."""
+        # Expired or cancelled batches still return what finished. Failed requests
+        # only appear in the error file and stay missing from partial.jsonl.
+        if not batch.output_file_id:
+            return
+        response = await self.client.files.content(batch.output_file_id)
+        done = self._done(job)
+        with open(self._path(job["id"], "partial.jsonl"), "a", encoding="utf-8") as f:
+            for line in response.text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                body = (item.get("response") or {}).get("body") or {}
+                choices = body.get("choices") or []
+                content = choices[0]["message"]["content"] if choices else None
+                if content is not None and item["custom_id"] not in done:
+                    f.write(json.dumps({"custom_id": item["custom_id"], "content": content},
+                                       ensure_ascii=False) + "\n")
+
+    def _write_results(self, job):
+        reviews = {row["custom_id"]: row["content"] for row in _read_jsonl(self._path(job["id"], "partial.jsonl"))}
+        with open(self._path(job["id"], "results.jsonl"), "w", encoding="utf-8") as f:
+            for paper in job["papers"]:
+                results = {criterion: reviews.get(f"{paper['id']}::{criterion}") for criterion in job["criteria"]}
+                f.write(json.dumps({
+                    "paper": paper["filename"],
+                    "criteria": {name: results.get(name) for name in ("Novelty", "Significance", "Soundness")},
+                    "section_review": results.get("Section"),
+                    "overall_review": results.get("Overall"),
+                    "error": paper.get("error"),
+                }, ensure_ascii=False) + "\n")
+
+    def results_path(self, job_id):
+        return self._path(job_id, "results.jsonl")
+
+    def status(self, job_id):
+        job = self.load(job_id)
+        status = {key: job[key] for key in ("id", "mode", "status", "total_requests", "completed_requests",
+                                            "failed_requests", "error", "created_at", "updated_at")}
+        status["papers"] = len(job["papers"])
+        status["openai_batch_ids"] = [shard["batch_id"] for shard in job["openai"].get("shards", [])
+                                      if shard.get("batch_id")]
+        return status
+
+
+def _create_manager():
+    from dotenv import load_dotenv
+    from openai import AsyncOpenAI
+    from review_engine import ReviewEngine
+    from main import DIGEST_PROMPT, PROMPTS
+
+    load_dotenv()
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return BatchManager(client, ReviewEngine(client, concurrency=BATCH_CONCURRENCY), PROMPTS, DIGEST_PROMPT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="create a job from a zip or directory and run it")
+    submit.add_argument("source")
+    submit.add_argument("--mode", choices=("local", "openai"), default="local")
+    status = commands.add_parser("status", help="print a job's status")
+    status.add_argument("job_id")
+    resume = commands.add_parser("resume", help="run every unfinished job to completion")
+    resume.add_argument("--retry-failed", action="store_true", help="also retry failed reviews of finished jobs")
+    args = parser.parse_args()
+
+    async def run():
+        manager = _create_manager()
+        if args.command == "submit":
+            job = manager.create_job(args.source, args.mode)
+            print(f"Created batch job {job['id']} with {len(job['papers'])} papers")
+            await manager.run(job["id"])
+            print(json.dumps(manager.status(job["id"]), indent=2))
+            print(f"Results: {manager.results_path(job['id'])}")
+        elif args.command == "status":
+            print(json.dumps(manager.status(args.job_id), indent=2))
+        else:
+            await asyncio.gather(*manager.resume_all(args.retry_failed))
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
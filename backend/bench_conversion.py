@@ -0,0 +1,58 @@
+"""Benchmark Word-to-PDF conversion throughput with fake_unoconv.py standing in for unoconv.
+
+    python bench_conversion.py --docs 20 --workers 4 --cold 2.0 --warm 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from conversion_service import ConversionService
+
+FAKE_CONVERTER = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_unoconv.py")]
+
+
+async def run(mode, docs, workers, duplicates):
+    service = ConversionService(command=FAKE_CONVERTER, workers=workers if mode == "pool" else 0,
+                                queue_size=docs, base_port=32002)
+    await service.start()
+    payloads = [f"document {i % max(docs - duplicates, 1)}".encode() for i in range(docs)]
+    latencies = []
+
+    async def one(data):
+        start = time.perf_counter()
+        await service.convert(data)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(data) for data in payloads))
+    finally:
+        await service.stop()
+    elapsed = time.perf_counter() - start
+
+    stats = service.stats()
+    print(f"{mode:>8}: {docs} docs in {elapsed:.2f}s | {docs / elapsed:.2f} docs/s | "
+          f"p50 {statistics.median(latencies):.2f}s | max {max(latencies):.2f}s | "
+          f"converted {stats['converted']} | deduplicated {stats['deduplicated']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--duplicates", type=int, default=0, help="how many payloads repeat an earlier one")
+    parser.add_argument("--cold", type=float, default=2.0, help="fake one-shot conversion seconds")
+    parser.add_argument("--warm", type=float, default=0.2, help="fake listener conversion seconds")
+    args = parser.parse_args()
+
+    os.environ["FAKE_UNOCONV_COLD"] = str(args.cold)
+    os.environ["FAKE_UNOCONV_WARM"] = str(args.warm)
+    for mode in ("one-shot", "pool"):
+        asyncio.run(run(mode, args.docs, args.workers, args.duplicates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark PDF text extraction on synthetic 10-300 page PDFs.
+
+Each configuration runs in a fresh subprocess so peak RSS is not shared.
+Peak RSS adds the benchmark process and every extraction pool worker (read
+from /proc, so worker memory is only counted on Linux); the largest worker
+is reported as well.
+
+    python bench_extraction.py --pages 10 50 300 --workers 1 4
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+WORDS = ("information systems research design science empirical evidence adoption "
+         "organizational capabilities theory measurement validity digital platform").split()
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def page_lines(page_index, lines_per_page=45):
+    lines = []
+    if page_index % 5 == 0:
+        lines.append(f"{page_index // 5 + 1} Section {page_index // 5 + 1}")
+    hyphenated = False
+    for i in range(lines_per_page):
+        words = [WORDS[(page_index * 7 + i * 3 + j) % len(WORDS)] for j in range(11)]
+        line = " ".join(words)
+        if hyphenated:
+            line = "tion " + line
+        if i % 9 == 8:
+            line = " ".join(words[:5]) + "."
+            hyphenated = False
+        else:
+            hyphenated = i % 6 == 2
+            if hyphenated:
+                line += " informa-"
+        lines.append(line)
+    lines.append(str(page_index + 1))
+    return lines
+
+
+def write_synthetic_pdf(path, pages):
+    """Write a plain-text PDF with `pages` pages using Helvetica."""
+    objects = [b"<</Type/Catalog/Pages 2 0 R>>", None, b"<</Type/Font/Subtype/Type1/BaseFont/Helvetica>>"]
+    kids = []
+    for page_index in range(pages):
+        text = "".join(f"({_escape(line)}) '\n" for line in page_lines(page_index))
+        stream = f"BT /F1 10 Tf 14 TL 50 780 Td\n{text}ET".encode("latin-1")
+        objects.append(b"<</Length %d>>stream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 842]"
+                       b"/Resources<</Font<</F1 3 0 R>>>>/Contents %d 0 R>>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<</Type/Pages/Kids[%s]/Count %d>>" % (b" ".join(b"%d 0 R" % k for k in kids), pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer<</Size %d/Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def _peak_rss_kb(pid):
+    """Peak resident set size (VmHWM) of a live process in KB, or None without /proc."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def measure(path, workers):
+    import extraction
+
+    start = time.perf_counter()
+    paragraphs = sum(1 for _ in extraction.iter_pdf_paragraphs(path, workers=workers))
+    elapsed = time.perf_counter() - start
+    # Pool workers are children of the forkserver, not of this process, so
+    # RUSAGE_CHILDREN never sees them; read their peaks while they are alive.
+    pool = extraction._pool
+    worker_pids = list(pool._processes) if pool is not None else []
+    worker_kb = [kb for kb in map(_peak_rss_kb, worker_pids) if kb is not None]
+    own_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": elapsed, "paragraphs": paragraphs, "peak_rss_mb": (own_kb + sum(worker_kb)) / 1024,
+                      "worker_peak_rss_mb": max(worker_kb, default=0) / 1024, "workers_measured": len(worker_kb)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 150, 300])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--measure", nargs=2, metavar=("PDF", "WORKERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure[0], int(args.measure[1]))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for pages in args.pages:
+            path = os.path.join(tmp_dir, f"synthetic-{pages}.pdf")
+            write_synthetic_pdf(path, pages)
+            for workers in args.workers:
+                # The shared pool is sized from EXTRACTION_WORKERS when first used.
+                output = subprocess.run([sys.executable, __file__, "--measure", path, str(workers)],
+                                        env=dict(os.environ, EXTRACTION_WORKERS=str(workers)),
+                                        check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{pages:>4} pages, {workers:>2} workers: {pages / result['seconds']:8.1f} pages/s | "
+                      f"{result['paragraphs']:>6} paragraphs | peak RSS {result['peak_rss_mb']:.1f} MB "
+                      f"(largest of {result['workers_measured']} workers {result['worker_peak_rss_mb']:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
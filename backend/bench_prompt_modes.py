@@ -0,0 +1,112 @@
+"""Compare the cost and latency of the review prompt layouts on one document.
+
+    python bench_prompt_modes.py --stub --latency 2.0                  # offline
+    python bench_prompt_modes.py paper.pdf --runs 3                     # real API (OPENAI_API_KEY)
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python bench_prompt_modes.py --runs 3
+
+Modes:
+    separate      five concurrent calls, all started at once
+    separate-warm five calls, the first one warms the shared prefix cache
+    combined      one structured-output call returning every criterion
+
+Cost uses per-million-token prices, by default those in metrics.TOKEN_PRICES.
+The server runs "separate" unless REVIEW_WARM_PREFIX=1; set it only if
+"separate-warm" is cheaper here without a p50 cost you can't accept.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from openai import AsyncOpenAI
+
+from extraction import iter_document_paragraphs
+from metrics import TOKEN_PRICES
+from review_engine import ReviewEngine
+from stub_openai import StubAsyncClient
+
+TEMPLATES = {
+    "Novelty": "templates/Novelty.txt",
+    "Significance": "templates/Significance.txt",
+    "Soundness": "templates/Soundness.txt",
+    "Section": "templates/Section.txt",
+    "Overall": "templates/overall_review.txt",
+}
+MODES = ("separate", "separate-warm", "combined")
+
+
+def load_prompts():
+    prompts = {}
+    for name, path in TEMPLATES.items():
+        with open(path, encoding="utf-8") as file:
+            prompts[name] = file.read().strip()
+    return prompts
+
+
+def synthetic_document(paragraphs=300):
+    return "\n\n".join(f"Paragraph {i}: the study measures effect {i} across {i % 7 + 2} cohorts and "
+                       f"reports that the intervention changed outcome {i % 11} by {i % 13} percent."
+                       for i in range(paragraphs))
+
+
+def cost(usage, args):
+    return (usage.get("uncached_tokens", 0) * args.input_price
+            + usage.get("cached_tokens", 0) * args.cached_price
+            + usage.get("completion_tokens", 0) * args.output_price) / 1e6
+
+
+async def run(mode, client, content, prompts, args):
+    engine = ReviewEngine(client, model=args.model, warm_prefix=mode == "separate-warm")
+    latencies = []
+    totals = {}
+    for i in range(args.runs):
+        # A fresh variant per run so no run reuses another's prefix cache entry.
+        document = f"[run {mode} {i}]\n\n{content}"
+        usage = {}
+        start = time.perf_counter()
+        if mode == "combined":
+            await engine.run_combined(document, prompts, usage=usage)
+        else:
+            await engine.run_reviews(document, prompts, usage=usage)
+        latencies.append(time.perf_counter() - start)
+        for key, value in usage.items():
+            totals[key] = totals.get(key, 0) + value
+
+    runs = args.runs
+    print(f"{mode:>13}: p50 {statistics.median(latencies):.2f}s | max {max(latencies):.2f}s | "
+          f"calls {totals.get('calls', 0) / runs:.0f} | "
+          f"prompt {totals.get('prompt_tokens', 0) / runs:.0f} "
+          f"(cached {totals.get('cached_tokens', 0) / runs:.0f}) | "
+          f"completion {totals.get('completion_tokens', 0) / runs:.0f} | "
+          f"${cost(totals, args) / runs:.4f}/paper")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("document", nargs="?", help=".pdf or .docx; a synthetic paper if omitted")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--stub", action="store_true", help="use StubAsyncClient instead of the API")
+    parser.add_argument("--latency", type=float, default=1.0, help="stub seconds per API call")
+    parser.add_argument("--input-price", type=float, default=TOKEN_PRICES["uncached"],
+                        help="$ per 1M uncached input tokens")
+    parser.add_argument("--cached-price", type=float, default=TOKEN_PRICES["cached"],
+                        help="$ per 1M cached input tokens")
+    parser.add_argument("--output-price", type=float, default=TOKEN_PRICES["completion"],
+                        help="$ per 1M output tokens")
+    args = parser.parse_args()
+
+    if args.document:
+        content = "\n\n".join(iter_document_paragraphs(args.document))
+    else:
+        content = synthetic_document()
+    prompts = load_prompts()
+
+    for mode in args.modes:
+        client = StubAsyncClient(latency=args.latency) if args.stub else AsyncOpenAI(max_retries=0)
+        asyncio.run(run(mode, client, content, prompts, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark ReviewEngine latency and throughput against a stub OpenAI backend.
+
+    python bench_review_engine.py --papers 20 --latency 2.0 --concurrency 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from review_engine import ReviewEngine
+from stub_openai import StubAsyncClient
+
+CRITERIA = ["Novelty", "Significance", "Soundness", "Section", "Overall"]
+
+
+async def review_sequentially(engine, content, prompts):
+    return {name: await engine.review(content, prompt) for name, prompt in prompts.items()}
+
+
+async def run(mode, papers, latency, jitter, concurrency):
+    client = StubAsyncClient(latency=latency, jitter=jitter)
+    engine = ReviewEngine(client, concurrency=concurrency)
+    prompts = {name: f"Review the paper for {name}." for name in CRITERIA}
+    runner = engine.run_reviews if mode == "concurrent" else lambda c, p: review_sequentially(engine, c, p)
+    latencies = []
+
+    async def one_paper(i):
+        start = time.perf_counter()
+        await runner(f"paper {i}", prompts)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_paper(i) for i in range(papers)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{mode:>10}: {papers} papers in {elapsed:.2f}s | "
+          f"{papers / elapsed:.2f} papers/s | "
+          f"p50 {statistics.median(latencies):.2f}s | "
+          f"max {latencies[-1]:.2f}s | "
+          f"calls {client.calls} | peak in-flight {client.max_in_flight}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub seconds per API call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=5, help="per-process API call limit")
+    args = parser.parse_args()
+
+    for mode in ("sequential", "concurrent"):
+        asyncio.run(run(mode, args.papers, args.latency, args.jitter, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import asyncio
+import os
+
+from extraction import HEADING_PREFIX, iter_sections
+from review_cache import sha256_hex
+from tokens import count_tokens
+
+REVIEW_MODE = os.getenv("REVIEW_MODE", "auto")
+FULL_TEXT_TOKEN_LIMIT = int(os.getenv("FULL_TEXT_TOKEN_LIMIT", 60000))
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", 8000))
+
+CHUNK_SEPARATOR = "\n\n"
+
+
+def _piece_tokens(piece):
+    """Tokens of one paragraph in a chunk, counting the separator joined after it."""
+    return count_tokens(piece) + count_tokens(CHUNK_SEPARATOR)
+
+
+def _split_paragraph(paragraph, budget):
+    """Split a paragraph that alone exceeds `budget` tokens on whitespace."""
+    if count_tokens(paragraph) <= budget:
+        return [paragraph]
+    pieces, current = [], []
+    current_tokens = 0
+    for word in paragraph.split(" "):
+        word_tokens = count_tokens(word) + 1
+        if current and current_tokens + word_tokens > budget:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def split_into_chunks(paragraphs, budget=CHUNK_TOKEN_BUDGET):
+    """Pack whole sections into chunks of at most `budget` tokens.
+
+    Sections larger than the budget are split between paragraphs, and each
+    continuation chunk repeats the section heading.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def close():
+        nonlocal current_tokens
+        if current:
+            chunks.append(CHUNK_SEPARATOR.join(current))
+            current.clear()
+            current_tokens = 0
+
+    for heading, body in iter_sections(paragraphs):
+        heading_line = [f"{HEADING_PREFIX}{heading}"] if heading else []
+        pieces = heading_line + body
+        section_tokens = sum(_piece_tokens(piece) for piece in pieces)
+
+        if current and current_tokens + section_tokens > budget:
+            close()
+        if section_tokens <= budget:
+            current.extend(pieces)
+            current_tokens += section_tokens
+            continue
+
+        # Leave room for the repeated heading next to an oversized paragraph's pieces.
+        piece_budget = budget - count_tokens(CHUNK_SEPARATOR) - sum(_piece_tokens(line) for line in heading_line)
+        for paragraph in body:
+            for piece in _split_paragraph(paragraph, max(piece_budget, 1)):
+                piece_tokens = _piece_tokens(piece)
+                if current and current_tokens + piece_tokens > budget:
+                    close()
+                if not current and heading_line:
+                    current.extend(heading_line)
+                    current_tokens += _piece_tokens(heading_line[0])
+                current.append(piece)
+                current_tokens += piece_tokens
+    close()
+    return chunks
+
+
+async def build_digest(engine, paragraphs, digest_prompt, budget=CHUNK_TOKEN_BUDGET, usage=None, limiter=None):
+    """Map step: condense every chunk in parallel and join the notes into one digest.
+
+    With a `limiter`, `await limiter.acquire()` is called before each chunk's call.
+    """
+    chunks = split_into_chunks(paragraphs, budget)
+
+    async def condense(chunk):
+        if limiter is not None:
+            await limiter.acquire()
+        return await engine.review(chunk, digest_prompt, usage, criterion="digest")
+
+    notes = await asyncio.gather(*(condense(chunk) for chunk in chunks))
+    for index, note in enumerate(notes):
+        if note is None:
+            raise RuntimeError(f"Failed to condense part {index + 1} of {len(chunks)} of the document.")
+    digest = "\n\n".join(
+        f"### Part {index + 1} of {len(chunks)}\n{note}" for index, note in enumerate(notes)
+    )
+    return digest, len(chunks)
+
+
+async def prepare_review_content(engine, paragraphs, full_text, digest_prompt, doc_hash=None, usage=None,
+                                 mode=REVIEW_MODE, full_text_limit=FULL_TEXT_TOKEN_LIMIT,
+                                 budget=CHUNK_TOKEN_BUDGET, limiter=None):
+    """Return `(content, info)` to send with every criterion prompt.
+
+    In "full" mode (or "auto" below `full_text_limit` tokens) that is the full
+    text. Otherwise it is a digest built by `build_digest`, shared by all five
+    criteria so the raw text is only sent once, chunk by chunk. `info` reports
+    the mode, the document's token count and the number of chunks, and
+    `info["review_hash"]` is the hash to key the criterion reviews on.
+    `limiter` is passed on to `build_digest`.
+    """
+    info = {"mode": "full", "document_tokens": count_tokens(full_text), "chunks": 0, "review_hash": doc_hash}
+    if mode == "full" or (mode == "auto" and info["document_tokens"] <= full_text_limit):
+        return full_text, info
+
+    info["mode"] = "map_reduce"
+    cache = engine.cache
+    key = None
+    if cache is not None and doc_hash:
+        key = cache.review_key(doc_hash, f"{digest_prompt}\nbudget={budget}", engine.model, engine.temperature)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return cached["digest"], _digest_info(info, cached["digest"], cached["chunks"], doc_hash)
+
+    digest, chunks = await build_digest(engine, paragraphs, digest_prompt, budget, usage, limiter)
+    if key is not None:
+        await asyncio.to_thread(cache.set, key, {"digest": digest, "chunks": chunks})
+    return digest, _digest_info(info, digest, chunks, doc_hash)
+
+
+def _digest_info(info, digest, chunks, doc_hash):
+    info["chunks"] = chunks
+    info["digest_tokens"] = count_tokens(digest)
+    info["review_hash"] = f"{doc_hash}:digest:{sha256_hex(digest)[:16]}" if doc_hash else None
+    return info
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import os
+import shlex
+import shutil
+import signal
+import tempfile
+
+import metrics
+
+CONVERTER_COMMAND = shlex.split(os.getenv("CONVERTER_COMMAND", "unoconv"))
+CONVERTER_WORKERS = int(os.getenv("CONVERTER_WORKERS", 2))
+CONVERTER_BASE_PORT = int(os.getenv("CONVERTER_BASE_PORT", 2002))
+CONVERTER_QUEUE_SIZE = int(os.getenv("CONVERTER_QUEUE_SIZE", 16))
+CONVERTER_QUEUE_TIMEOUT = float(os.getenv("CONVERTER_QUEUE_TIMEOUT", 5))
+CONVERTER_TIMEOUT = float(os.getenv("CONVERTER_TIMEOUT", 120))
+# How long a (re)started listener may take to accept connections on its port.
+CONVERTER_START_TIMEOUT = float(os.getenv("CONVERTER_START_TIMEOUT", 30))
+
+
+class ConversionError(Exception):
+    pass
+
+
+class ConversionQueueFull(ConversionError):
+    """Raised when the bounded job queue stays full; callers should answer 503."""
+
+
+class ConversionTimeout(ConversionError):
+    pass
+
+
+async def _run(command, timeout):
+    """Run a subprocess without blocking the event loop; kill it on timeout."""
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise ConversionTimeout(f"Conversion timed out after {timeout:g}s")
+    return process.returncode, stderr
+
+
+async def convert_once(data, command=CONVERTER_COMMAND, port=None, timeout=CONVERTER_TIMEOUT):
+    """Convert .docx bytes to PDF bytes with one converter invocation.
+
+    With `port`, the converter talks to an already running listener; without
+    it, unoconv boots its own office instance (the slow cold-start path).
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        docx_path = os.path.join(tmp_dir, "input.docx")
+        pdf_path = os.path.join(tmp_dir, "output.pdf")
+        with open(docx_path, "wb") as f:
+            f.write(data)
+
+        port_args = ["--port", str(port)] if port is not None else []
+        with metrics.span("unoconv" if port is not None else "unoconv_cold"):
+            returncode, stderr = await _run([*command, *port_args, "-f", "pdf", "-o", pdf_path, docx_path],
+                                            timeout)
+        if returncode != 0:
+            raise ConversionError(f"Unoconv error: {stderr.decode('utf-8', 'replace')}")
+
+        with open(pdf_path, "rb") as f:
+            return f.read()
+
+
+class _Listener:
+    def __init__(self, command, port, start_timeout=CONVERTER_START_TIMEOUT):
+        self.command = command
+        self.port = port
+        self.start_timeout = start_timeout
+        self.process = None
+        self.restarts = 0
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        # Own process group, so stopping it also takes down the office process unoconv started.
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, "--listener", "--port", str(self.port),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL, start_new_session=True
+        )
+        await self._wait_ready()
+
+    async def _wait_ready(self):
+        """Wait until the office process accepts connections, so the first job does not race its boot."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.start_timeout
+        while True:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            except OSError:
+                if not self.alive:
+                    raise ConversionError(f"Converter listener on port {self.port} exited with code "
+                                          f"{self.process.returncode}")
+                if loop.time() >= deadline:
+                    await self.stop()
+                    raise ConversionTimeout(f"Converter listener on port {self.port} did not start within "
+                                            f"{self.start_timeout:g}s")
+                await asyncio.sleep(0.1)
+                continue
+            writer.close()
+            return
+
+    async def ensure_started(self):
+        if not self.alive:
+            if self.process is not None:
+                self.restarts += 1
+                print(f"Restarting converter listener on port {self.port}")
+            await self.start()
+
+    async def stop(self):
+        if self.alive:
+            self._signal(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                self._signal(signal.SIGKILL)
+                await self.process.wait()
+
+    def _signal(self, signum):
+        try:
+            os.killpg(self.process.pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+class ConversionService:
+    """Pool of long-lived unoconv listeners fed from a bounded job queue.
+
+    Identical inputs submitted while a conversion is running share its result.
+    When no listener can be started (e.g. unoconv is missing), `convert` falls
+    back to the one-shot path, one conversion at a time as before. A listener
+    that crashes or hangs under a job is killed and restarted for one retry;
+    if that fails too, the job is converted one-shot.
+    """
+
+    def __init__(self, command=CONVERTER_COMMAND, workers=CONVERTER_WORKERS, base_port=CONVERTER_BASE_PORT,
+                 queue_size=CONVERTER_QUEUE_SIZE, queue_timeout=CONVERTER_QUEUE_TIMEOUT, timeout=CONVERTER_TIMEOUT,
+                 start_timeout=CONVERTER_START_TIMEOUT):
+        self.command = command
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.queue_size = queue_size
+        self.listeners = [_Listener(command, base_port + i, start_timeout) for i in range(workers)]
+        self.queue = None
+        self._workers = []
+        self._inflight = {}
+        self._one_shot_lock = asyncio.Lock()
+        self.converted = 0
+        self.deduplicated = 0
+
+    @property
+    def pooled(self):
+        return bool(self._workers)
+
+    async def start(self):
+        if not self.listeners or shutil.which(self.command[0]) is None:
+            print("No converter listener available; using one-shot conversion.")
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        started = await asyncio.gather(*(listener.start() for listener in self.listeners), return_exceptions=True)
+        for listener, error in zip(self.listeners, started):
+            if isinstance(error, (ConversionError, OSError)):
+                print(f"Could not start converter listener on port {listener.port}: {error}")
+                continue
+            if error is not None:
+                raise error
+            self._workers.append(asyncio.create_task(self._work(listener)))
+        if not self._workers:
+            print("No converter listener available; using one-shot conversion.")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        for listener in self.listeners:
+            await listener.stop()
+
+    async def convert(self, data):
+        """Return PDF bytes for `data`, sharing work with identical in-flight inputs."""
+        key = hashlib.sha256(data).hexdigest()
+        future = self._inflight.get(key)
+        if future is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            if self.pooled:
+                result = await self._submit(data)
+            else:
+                async with self._one_shot_lock:
+                    result = await convert_once(data, self.command, timeout=self.timeout)
+            future.set_result(result)
+            self.converted += 1
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so waiter-less failures are not logged.
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _submit(self, data):
+        job = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self.queue.put((data, job)), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ConversionQueueFull("Conversion queue is full, please retry shortly.")
+        return await job
+
+    async def _work(self, listener):
+        while True:
+            data, job = await self.queue.get()
+            try:
+                if job.cancelled():
+                    continue
+                result = await self._convert_on(listener, data)
+                if not job.done():
+                    job.set_result(result)
+            except Exception as e:
+                if not job.done():
+                    job.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def _convert_on(self, listener, data):
+        for attempt in range(2):
+            try:
+                await listener.ensure_started()
+                return await convert_once(data, self.command, listener.port, self.timeout)
+            except (ConversionError, OSError) as e:
+                if listener.alive and not isinstance(e, ConversionTimeout):
+                    raise  # The listener is fine; the document itself failed to convert.
+                # The listener crashed, could not start, or is wedged: kill it so it restarts.
+                print(f"Converter listener on port {listener.port} failed ({e!r}), attempt {attempt + 1}")
+                await listener.stop()
+        async with self._one_shot_lock:
+            return await convert_once(data, self.command, timeout=self.timeout)
+
+    def stats(self):
+        return {
+            "pooled": self.pooled,
+            "workers": len(self._workers),
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "restarts": sum(listener.restarts for listener in self.listeners),
+            "converted": self.converted,
+            "deduplicated": self.deduplicated,
+        }
@@ -0,0 +1,198 @@
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DOCUMENT_STORE_MEMORY_BYTES = int(os.getenv("DOCUMENT_STORE_MEMORY_BYTES", 64 * 1024 * 1024))
+DOCUMENT_STORE_DISK_BYTES = int(os.getenv("DOCUMENT_STORE_DISK_BYTES", 2 * 1024 * 1024 * 1024))
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR") or os.path.join(tempfile.gettempdir(), "peerpolish-documents")
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Entry:
+    __slots__ = ("suffix", "size", "data", "path", "meta", "pins")
+
+    def __init__(self, suffix, size, data, meta):
+        self.suffix = suffix
+        self.size = size
+        self.data = data
+        self.path = None
+        self.meta = meta
+        self.pins = 0
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class DocumentStore:
+    """Content-addressed store for uploaded documents.
+
+    Documents are keyed by the SHA-256 of their bytes, so re-uploads and two
+    users submitting "paper.pdf" never collide. Up to `memory_bytes` stay in
+    memory; least recently used documents spill to `directory` and are read
+    back through mmap. Spilled files beyond `disk_bytes` are dropped for good.
+
+    Each process spills into its own `directory/<pid>` subdirectory, so
+    `disk_bytes` bounds what this process wrote; directories left behind by
+    processes that are no longer running are removed on start-up. Documents
+    handed out through `pinned_path` are not evicted until released.
+
+    Methods can block on hashing and file I/O, or on the lock while another
+    thread spills; async callers run them in a worker thread.
+    """
+
+    def __init__(self, memory_bytes=DOCUMENT_STORE_MEMORY_BYTES, disk_bytes=DOCUMENT_STORE_DISK_BYTES,
+                 directory=DOCUMENT_STORE_DIR):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._remove_stale(directory)
+        self.directory = os.path.join(directory, str(os.getpid()))
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+        self._entries = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+        self._lock = threading.RLock()
+
+    def put(self, data, suffix, **meta):
+        """Store `data` and return its document ID (the hex SHA-256)."""
+        if not data:
+            raise ValueError("Cannot store an empty document.")
+        doc_id = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is not None:
+                entry.meta.update(meta)
+                self._entries.move_to_end(doc_id)
+                return doc_id
+            self._entries[doc_id] = _Entry(suffix, len(data), bytes(data), dict(meta))
+            self._memory_used += len(data)
+            self._evict()
+        return doc_id
+
+    def __contains__(self, doc_id):
+        return doc_id in self._entries
+
+    def meta(self, doc_id):
+        """Return {"suffix", "size", **meta} for a document, or None if unknown."""
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                return None
+            return {"suffix": entry.suffix, "size": entry.size, **entry.meta}
+
+    def update_meta(self, doc_id, **meta):
+        with self._lock:
+            self._entries[doc_id].meta.update(meta)
+
+    @contextmanager
+    def pinned_path(self, doc_id):
+        """Yield a file path holding the document, spilling it if needed; the file stays until exit."""
+        with self._lock:
+            entry = self._entry(doc_id)
+            if entry.path is None:
+                self._spill(doc_id, entry)
+            entry.pins += 1
+        try:
+            yield entry.path
+        finally:
+            with self._lock:
+                entry.pins -= 1
+                self._evict()
+
+    def read(self, doc_id):
+        """Return the document's bytes."""
+        with self._lock:
+            entry = self._entry(doc_id)
+            if entry.data is not None:
+                return entry.data
+            f = open(entry.path, "rb")
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:]
+
+    def iter_chunks(self, doc_id, chunk_size=CHUNK_SIZE):
+        """Yield the document in chunks, memory-mapping it when it lives on disk."""
+        with self._lock:
+            entry = self._entry(doc_id)
+            data = entry.data
+            f = open(entry.path, "rb") if data is None else None
+        if data is not None:
+            view = memoryview(data)
+            for start in range(0, len(view), chunk_size):
+                yield bytes(view[start:start + chunk_size])
+            return
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, len(mm), chunk_size):
+                yield mm[start:start + chunk_size]
+
+    def stats(self):
+        with self._lock:
+            in_memory = sum(1 for entry in self._entries.values() if entry.data is not None)
+            return {"documents": len(self._entries), "in_memory": in_memory,
+                    "memory_bytes": self._memory_used, "disk_bytes": self._disk_used}
+
+    @staticmethod
+    def _remove_stale(directory):
+        """Delete spill directories of processes that have exited (and pre-per-process leftovers)."""
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.isdigit() and os.path.isdir(path):
+                if int(name) != os.getpid() and not _pid_alive(int(name)):
+                    shutil.rmtree(path, ignore_errors=True)
+            elif os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _entry(self, doc_id):
+        entry = self._entries.get(doc_id)
+        if entry is None:
+            raise KeyError(f"Unknown document id: {doc_id}")
+        self._entries.move_to_end(doc_id)
+        return entry
+
+    def _spill(self, doc_id, entry):
+        path = os.path.join(self.directory, f"{doc_id}{entry.suffix}")
+        tmp_path = f"{path}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(entry.data)
+        os.replace(tmp_path, path)
+        entry.path = path
+        self._disk_used += entry.size
+
+    def _evict(self):
+        for doc_id, entry in list(self._entries.items()):
+            if self._memory_used <= self.memory_bytes:
+                break
+            if entry.data is None:
+                continue
+            if entry.path is None:
+                self._spill(doc_id, entry)
+            entry.data = None
+            self._memory_used -= entry.size
+
+        for doc_id, entry in list(self._entries.items()):
+            if self._disk_used <= self.disk_bytes:
+                break
+            if entry.path is None or entry.data is not None or entry.pins:
+                continue
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            self._disk_used -= entry.size
+            del self._entries[doc_id]
@@ -0,0 +1,210 @@
+import multiprocessing
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+from docx import Document
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1))
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PARALLEL_PAGE_THRESHOLD", 40))
+PAGES_PER_TASK = int(os.getenv("PAGES_PER_TASK", 16))
+
+# Bump when paragraph reconstruction changes so cached parses are not reused.
+EXTRACTOR_VERSION = "4"
+
+HEADING_PREFIX = "## "
+
+KNOWN_HEADINGS = {
+    "abstract", "introduction", "background", "related work", "literature review",
+    "theoretical background", "theory", "hypotheses", "research model", "method", "methods",
+    "methodology", "research method", "research methodology", "data", "data collection",
+    "analysis", "data analysis", "results", "findings", "evaluation", "discussion",
+    "implications", "limitations", "future research", "conclusion", "conclusions",
+    "acknowledgements", "acknowledgments", "references", "appendix",
+    "摘要", "引言", "前言", "绪论", "文献综述", "相关研究", "理论基础", "研究假设", "研究方法", "研究设计",
+    "数据", "数据分析", "结果", "研究结果", "讨论", "局限性", "结论", "结论与展望", "参考文献", "致谢", "附录",
+}
+CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+NUMBERED_HEADING = re.compile(r"^(?:(?:\d{1,2}(?:\.\d{1,2}){0,3}\.?|[IVX]{1,5}\.|[A-H]\.)\s+|[一二三四五六七八九十]{1,3}、\s*)"
+                              rf"([A-Z][^.!?]{{1,80}}|[{CJK}][^。！？，；.!?]{{0,40}})$")
+PAGE_NUMBER = re.compile(r"^(?:page\s+)?\d{1,4}(?:\s+of\s+\d{1,4})?$", re.IGNORECASE)
+SENTENCE_END = re.compile(r"[.!?:;)\"'”。！？；：）」』]$")
+CJK_CHAR = re.compile(f"[{CJK}]")
+# Words that mark a numbered line as a sentence or list item rather than a heading.
+SENTENCE_WORDS = {
+    "is", "are", "was", "were", "be", "been", "being", "has", "have", "had", "do", "does", "did",
+    "will", "would", "can", "could", "may", "might", "shall", "should", "must", "we", "i", "they",
+}
+# A heading does not end on a word that needs a continuation.
+DANGLING_WORDS = {"a", "an", "the", "and", "or", "of", "to", "in", "from", "with", "for", "by", "on", "at", "as"}
+
+
+def is_heading(line, next_line=""):
+    """Heuristic section-heading test for a single extracted line.
+
+    `next_line` is the following line, if known; a line continued by one
+    starting in lowercase is a wrapped sentence, not a heading.
+    """
+    line = line.strip()
+    if not line or len(line) > 90 or next_line[:1].islower():
+        return False
+    if line.rstrip(":：").lower() in KNOWN_HEADINGS:
+        return True
+    match = NUMBERED_HEADING.match(line)
+    if not match:
+        return False
+    words = match.group(1).lower().split()
+    return len(words) <= 10 and not SENTENCE_WORDS.intersection(words) and words[-1] not in DANGLING_WORDS
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_pool():
+    """The shared extraction pool of EXTRACTION_WORKERS processes, created on first use.
+
+    Workers are started through forkserver (or spawn) rather than by forking
+    the multi-threaded server process, and are reused across documents. As
+    with any spawned pool, scripts using it need an `if __name__ == "__main__"`
+    guard. A pool broken by a crashed worker is replaced.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._broken:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _extract_page_range(path, start, stop):
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def iter_pdf_pages(source, workers=EXTRACTION_WORKERS):
+    """Yield the text of each page in order.
+
+    `source` is a path or a binary file object. Large PDFs given by path are
+    split into page ranges and extracted in the shared `process_pool`;
+    `workers <= 1` keeps extraction in the calling process.
+    """
+    reader = PdfReader(source)
+    page_count = len(reader.pages)
+    if not isinstance(source, (str, os.PathLike)) or workers <= 1 or page_count < PARALLEL_PAGE_THRESHOLD:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    del reader
+    starts = range(0, page_count, PAGES_PER_TASK)
+    stops = [min(start + PAGES_PER_TASK, page_count) for start in starts]
+    for pages in process_pool().map(_extract_page_range, [source] * len(starts), starts, stops):
+        yield from pages
+
+
+def _with_next(lines):
+    """Yield (line, next_line) over whitespace-normalized lines, dropping bare page numbers."""
+    previous = None
+    for raw in lines:
+        line = " ".join(raw.split())
+        if PAGE_NUMBER.match(line):
+            continue
+        if previous is not None:
+            yield previous, line
+        previous = line
+    if previous is not None:
+        yield previous, ""
+
+
+def iter_paragraphs(lines):
+    """Merge extracted lines back into paragraphs.
+
+    Hyphenated line breaks are re-joined, wrapped lines are merged (without a
+    space between CJK characters), bare page
+    numbers are dropped, and detected headings become their own paragraph
+    prefixed with HEADING_PREFIX. A paragraph ends at a blank line or at a
+    short line ending a sentence.
+    """
+    recent_lengths = deque(maxlen=50)
+    parts = []
+
+    def flush():
+        text = "".join(parts).strip()
+        parts.clear()
+        return text
+
+    for line, next_line in _with_next(lines):
+        if not line:
+            if parts:
+                yield flush()
+            continue
+        if is_heading(line, next_line):
+            if parts:
+                yield flush()
+            yield HEADING_PREFIX + line.rstrip(":：")
+            continue
+
+        if parts:
+            previous = parts[-1]
+            if previous.endswith("-") and len(previous) > 1 and previous[-2].isalpha() and line[0].islower():
+                parts[-1] = previous[:-1]
+            elif CJK_CHAR.match(previous[-1]) and CJK_CHAR.match(line[0]):
+                # CJK text has no spaces between words, so wrapped lines join directly.
+                pass
+            else:
+                parts.append(" ")
+        parts.append(line)
+
+        recent_lengths.append(len(line))
+        if SENTENCE_END.search(line) and len(line) < 0.75 * max(recent_lengths):
+            yield flush()
+
+    if parts:
+        yield flush()
+
+
+def iter_pdf_paragraphs(source, workers=EXTRACTION_WORKERS):
+    return iter_paragraphs(line for page in iter_pdf_pages(source, workers) for line in page.split("\n"))
+
+
+def iter_docx_paragraphs(source):
+    """Yield non-empty .docx paragraphs, marking Word heading styles as headings."""
+    for paragraph in Document(source).paragraphs:
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style = paragraph.style.name if paragraph.style is not None else ""
+        if style.startswith("Heading") or style == "Title":
+            yield HEADING_PREFIX + text
+        else:
+            yield text
+
+
+def iter_document_paragraphs(file_path):
+    """Yield paragraphs of a .docx or .pdf file."""
+    if file_path.endswith(".docx"):
+        return iter_docx_paragraphs(file_path)
+    elif file_path.endswith(".pdf"):
+        return iter_pdf_paragraphs(file_path)
+    else:
+        raise ValueError("Unsupported file format. Please provide a .docx or .pdf file.")
+
+
+def iter_sections(paragraphs):
+    """Group paragraphs into (heading, [paragraphs]) pairs; text before the first heading has heading None."""
+    heading = None
+    body = []
+    for paragraph in paragraphs:
+        if paragraph.startswith(HEADING_PREFIX):
+            if heading is not None or body:
+                yield heading, body
+            heading = paragraph[len(HEADING_PREFIX):]
+            body = []
+        else:
+            body.append(paragraph)
+    if heading is not None or body:
+        yield heading, body
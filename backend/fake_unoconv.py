@@ -0,0 +1,52 @@
+"""Stand-in for the unoconv CLI used by benchmarks and load tests.
+
+Accepts the same flags ConversionService passes to unoconv. One-shot calls
+(no --port) sleep FAKE_UNOCONV_COLD seconds to mimic LibreOffice start-up;
+calls against a listener sleep FAKE_UNOCONV_WARM seconds. A listener accepts
+connections on its port after FAKE_UNOCONV_BOOT seconds, and calls against a
+port nobody listens on fail like unoconv does.
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+
+MINIMAL_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listener", action="store_true")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("-f", dest="format")
+    parser.add_argument("-o", dest="output")
+    parser.add_argument("input", nargs="?")
+    args = parser.parse_args()
+
+    if args.listener:
+        time.sleep(float(os.getenv("FAKE_UNOCONV_BOOT", 0)))
+        with socket.create_server(("127.0.0.1", args.port)) as server:
+            while True:
+                connection, _ = server.accept()
+                connection.close()
+
+    if args.port:
+        try:
+            socket.create_connection(("127.0.0.1", args.port), timeout=1).close()
+        except OSError as e:
+            sys.exit(f"Unable to connect to the listener on port {args.port}: {e}")
+
+    delay_env = "FAKE_UNOCONV_WARM" if args.port else "FAKE_UNOCONV_COLD"
+    time.sleep(float(os.getenv(delay_env, 0.2 if args.port else 2.0)))
+    with open(args.output, "wb") as f:
+        f.write(MINIMAL_PDF)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Load test the FastAPI app end to end with a stubbed OpenAI client and unoconv.
+
+Starts `main:app` under uvicorn in a subprocess (OpenAI replaced by
+StubAsyncClient, unoconv by fake_unoconv.py, review cache off so every request
+does the full work), then drives it with concurrent clients and reports
+p50/p99 latency per scenario, requests/sec, and the mean time per stage
+scraped from /metrics.
+
+    python loadtest.py --concurrency 8 --requests 200
+    python loadtest.py --json run.json                       # save a result
+    python loadtest.py --baseline run.json --tolerance 0.2   # exit 1 on regression
+
+Scenarios (weights via --mix):
+    review      POST /generate-response/ with a PDF upload
+    stream      POST /generate-response/stream/ for an uploaded document ID
+    upload_docx POST /upload/?preview=false with a Word file (unoconv path)
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from docx import Document
+from prometheus_client.parser import text_string_to_metric_families
+
+from bench_extraction import write_synthetic_pdf
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_CONVERTER = [sys.executable, os.path.join(HERE, "fake_unoconv.py")]
+WORD_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+SCENARIOS = ("review", "stream", "upload_docx")
+
+
+def serve(args):
+    """Child process: the real app with the OpenAI client swapped for the stub."""
+    import uvicorn
+
+    import main
+    from stub_openai import StubAsyncClient
+
+    random.seed(args.seed)
+    main.engine.client = StubAsyncClient(latency=args.latency, jitter=args.jitter, chunk_delay=args.chunk_delay)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir):
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="stub",
+        REVIEW_CACHE_BACKEND="none",
+        CONVERTER_COMMAND=shlex.join(FAKE_CONVERTER),
+        FAKE_UNOCONV_WARM=str(args.unoconv),
+        DOCUMENT_STORE_DIR=os.path.join(workdir, "documents"),
+        BATCH_DIR=os.path.join(workdir, "batch_jobs"),
+        METRICS_LOG_REQUESTS="1" if args.server_log else "0",
+    )
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port),
+               "--seed", str(args.seed), "--latency", str(args.latency), "--jitter", str(args.jitter),
+               "--chunk-delay", str(args.chunk_delay)]
+    output = None if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen(command, cwd=HERE, env=env, stdout=output, stderr=output)
+
+
+async def wait_until_ready(client, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def make_fixtures(args, workdir):
+    """`--variants` distinct PDFs and .docx files, so requests are not all deduplicated."""
+    pdfs, docxs = [], []
+    for i in range(args.variants):
+        path = os.path.join(workdir, f"paper-{i}.pdf")
+        write_synthetic_pdf(path, args.pages + i % 3)
+        with open(path, "rb") as f:
+            pdfs.append(f.read())
+
+        document = Document()
+        document.add_heading(f"Load test paper {i}", level=1)
+        for j in range(40):
+            document.add_paragraph(f"Variant {i}, paragraph {j}: the method is evaluated on cohort {j % 5}.")
+        buffer = io.BytesIO()
+        document.save(buffer)
+        docxs.append(buffer.getvalue())
+    return pdfs, docxs
+
+
+async def run_scenario(client, scenario, i, pdfs, docxs, document_ids):
+    if scenario == "review":
+        files = {"file": (f"paper-{i}.pdf", pdfs[i % len(pdfs)], "application/pdf")}
+        response = await client.post("/generate-response/", files=files)
+        return response.status_code == 200
+    if scenario == "stream":
+        data = {"document_id": document_ids[i % len(document_ids)]}
+        async with client.stream("POST", "/generate-response/stream/", data=data) as response:
+            body = "".join([text async for text in response.aiter_text()])
+        return response.status_code == 200 and "event: done" in body
+    files = {"file": (f"paper-{i}.docx", docxs[i % len(docxs)], WORD_CONTENT_TYPE)}
+    response = await client.post("/upload/", params={"preview": "false"}, files=files)
+    return response.status_code == 200
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples, elapsed):
+    summary = {"requests": len(samples), "elapsed": elapsed, "rps": len(samples) / elapsed, "scenarios": {}}
+    for scenario in SCENARIOS:
+        latencies = [latency for name, latency, _ in samples if name == scenario]
+        if latencies:
+            summary["scenarios"][scenario] = {
+                "count": len(latencies),
+                "errors": sum(1 for name, _, ok in samples if name == scenario and not ok),
+                "p50": statistics.median(latencies),
+                "p99": percentile(latencies, 0.99),
+            }
+    return summary
+
+
+def stage_means(metrics_text):
+    """Mean seconds per stage (and per criterion for OpenAI calls) from the stage histogram."""
+    sums, counts = {}, {}
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != "peerpolish_stage_seconds":
+            continue
+        for sample in family.samples:
+            label = sample.labels["stage"]
+            if sample.labels.get("criterion"):
+                label += f"[{sample.labels['criterion']}]"
+            if sample.name.endswith("_sum"):
+                sums[label] = sample.value
+            elif sample.name.endswith("_count"):
+                counts[label] = sample.value
+    return {label: sums[label] / counts[label] for label in sorted(counts) if counts[label]}
+
+
+async def drive(args, pdfs, docxs):
+    weights = [args.mix.get(scenario, 0) for scenario in SCENARIOS]
+    rng = random.Random(args.seed)
+    plan = rng.choices(SCENARIOS, weights=weights, k=args.warmup + args.requests)
+    samples = []
+
+    timeout = httpx.Timeout(300)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=timeout, limits=limits) as client:
+        await wait_until_ready(client, args.process)
+        document_ids = []
+        for i, pdf in enumerate(pdfs):
+            response = await client.post("/upload/", params={"preview": "false"},
+                                         files={"file": (f"paper-{i}.pdf", pdf, "application/pdf")})
+            document_ids.append(response.json()["document_id"])
+
+        queue = asyncio.Queue()
+        for item in enumerate(plan):
+            queue.put_nowait(item)
+
+        async def worker():
+            while not queue.empty():
+                i, scenario = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    ok = await run_scenario(client, scenario, i, pdfs, docxs, document_ids)
+                except httpx.HTTPError:
+                    ok = False
+                if i >= args.warmup:
+                    samples.append((scenario, time.perf_counter() - start, ok))
+
+        # Warm-up requests run first and are not measured.
+        for _ in range(args.warmup):
+            i, scenario = queue.get_nowait()
+            await run_scenario(client, scenario, i, pdfs, docxs, document_ids)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        metrics_text = (await client.get("/metrics")).text
+
+    summary = summarize(samples, elapsed)
+    summary["stages"] = stage_means(metrics_text)
+    summary["config"] = {key: getattr(args, key) for key in ("concurrency", "requests", "latency", "jitter",
+                                                               "chunk_delay", "unoconv", "pages", "seed")}
+    summary["config"]["mix"] = args.mix
+    return summary
+
+
+def report(summary):
+    print(f"{summary['requests']} requests in {summary['elapsed']:.2f}s | {summary['rps']:.2f} req/s")
+    for scenario, stats in summary["scenarios"].items():
+        print(f"  {scenario:>12}: n={stats['count']:<4} errors={stats['errors']:<3} "
+              f"p50 {stats['p50'] * 1000:8.1f}ms | p99 {stats['p99'] * 1000:8.1f}ms")
+    print("Mean time per stage:")
+    for label, seconds in summary["stages"].items():
+        print(f"  {label:>32}: {seconds * 1000:8.1f}ms")
+
+
+def regressions(summary, baseline, tolerance):
+    problems = []
+    if summary["rps"] < baseline["rps"] * (1 - tolerance):
+        problems.append(f"req/s {summary['rps']:.2f} < baseline {baseline['rps']:.2f}")
+    for scenario, stats in summary["scenarios"].items():
+        before = baseline["scenarios"].get(scenario)
+        if before is None:
+            continue
+        for key in ("p50", "p99"):
+            if stats[key] > before[key] * (1 + tolerance):
+                problems.append(f"{scenario} {key} {stats[key] * 1000:.1f}ms > baseline {before[key] * 1000:.1f}ms")
+        if stats["errors"] > before["errors"]:
+            problems.append(f"{scenario} errors {stats['errors']} > baseline {before['errors']}")
+    return problems
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("review=2,stream=2,upload_docx=1"))
+    parser.add_argument("--latency", type=float, default=0.5, help="stub seconds per OpenAI call")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="stub seconds between streamed chunks")
+    parser.add_argument("--unoconv", type=float, default=0.2, help="fake unoconv seconds per conversion")
+    parser.add_argument("--pages", type=int, default=8, help="pages per synthetic PDF")
+    parser.add_argument("--variants", type=int, default=8, help="distinct documents per file type")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--json", help="write the summary to this file")
+    parser.add_argument("--baseline", help="summary JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--server-log", action="store_true", help="show the server's output and JSON request log")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    args.port = args.port or free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        pdfs, docxs = make_fixtures(args, workdir)
+        args.process = start_server(args, workdir)
+        try:
+            summary = asyncio.run(drive(args, pdfs, docxs))
+        finally:
+            args.process.terminate()
+            args.process.wait()
+
+    report(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = regressions(summary, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
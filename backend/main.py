@@ -1,14 +1,22 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
-from subprocess import Popen, PIPE
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 import os
-from io import BytesIO
+import json
+import shutil
 import tempfile
-from openai import OpenAI
-from PyPDF2 import PdfReader
+from openai import AsyncOpenAI
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
-from docx import Document
+from review_engine import ReviewEngine
+from prompt_assembly import REVIEW_PROMPT_MODE
+from review_cache import create_review_cache
+from document_store import DocumentStore
+from extraction import EXTRACTOR_VERSION, iter_document_paragraphs
+from chunking import prepare_review_content
+from batch_jobs import BATCH_CONCURRENCY, FINISHED, BatchManager
+from conversion_service import ConversionService, ConversionQueueFull
+import metrics
 
 app = FastAPI()
 load_dotenv()
@@ -19,9 +27,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Document-Id"],
 )
+app.add_middleware(metrics.RequestMetricsMiddleware)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))  
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+review_cache = create_review_cache()
+engine = ReviewEngine(client, cache=review_cache)
 
 @app.get("/")
 def read_root():
@@ -33,7 +45,26 @@ if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=port)
 
-uploaded_files_cache = {}
+document_store = DocumentStore()
+conversion_service = ConversionService()
+
+
+@app.on_event("startup")
+async def start_conversion_service():
+    await conversion_service.start()
+
+
+@app.on_event("shutdown")
+async def stop_conversion_service():
+    await conversion_service.stop()
+
+
+@app.on_event("shutdown")
+async def flush_review_cache():
+    if review_cache is not None:
+        await run_in_threadpool(review_cache.flush)
+
+WORD_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
 
 
 def load_prompt(file_path):
@@ -48,98 +79,119 @@ PROMPTS = {
     "Overall": load_prompt("templates/overall_review.txt")
 }
 
-def call_openai_chat_api(content,prompt, model="gpt-4o"):
-    try:
-        messages = [
-            {
-                "role": "system",
-                "content": f"Here is the background content for evaluation:\n\n{content}"
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=model,
-            temperature=0
-        )
-        chat_completion_dict = chat_completion.model_dump()
-        return chat_completion_dict["choices"][0]["message"]["content"]
+DIGEST_PROMPT = load_prompt("templates/chunk_digest.txt")
+
+# Batch jobs get their own engine (and concurrency limit) so they never queue ahead of interactive reviews.
+batch_engine = ReviewEngine(client, cache=review_cache, concurrency=BATCH_CONCURRENCY)
+batch_manager = BatchManager(client, batch_engine, PROMPTS, DIGEST_PROMPT)
 
-    except Exception as e:
-        print(f"Error during API call: {str(e)}")
-        return None
 
+@app.on_event("startup")
+async def resume_batch_jobs():
+    batch_manager.resume_all()
 
 def load_document(file_path):
     """Load .docx or .pdf file and return its paragraphs."""
-    if file_path.endswith(".docx"):
-        return load_docx(file_path)
-    elif file_path.endswith(".pdf"):
-        return load_pdf(file_path)
-    else:
-        raise ValueError("Unsupported file format. Please provide a .docx or .pdf file.")
-
-def load_docx(file_path):
-    """Load .docx file and return its paragraphs."""
-    doc = Document(file_path)
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
+    return list(iter_document_paragraphs(file_path))
+
+def load_stored_document(doc_id):
+    """Parse a stored document; it stays on disk (spilled if needed) until parsing is done."""
+    with document_store.pinned_path(doc_id) as path:
+        return load_document(path)
+
+async def load_document_cached(doc_id):
+    """Parse a stored document into paragraphs, reusing earlier parses of identical bytes."""
+    key = review_cache.document_key(doc_id, EXTRACTOR_VERSION) if review_cache else None
+    paragraphs = await run_in_threadpool(review_cache.get, key) if key else None
+    if paragraphs is None:
+        with metrics.span("extraction"):
+            paragraphs = await run_in_threadpool(load_stored_document, doc_id)
+        if key:
+            await run_in_threadpool(review_cache.set, key, paragraphs)
     return paragraphs
 
-def load_pdf(file_path):
-    """Load .pdf file and return its text as paragraphs."""
-    reader = PdfReader(file_path)
-    paragraphs = []
-    for page in reader.pages:
-        text = page.extract_text()
-        if text:
-            paragraphs.extend(text.split("\n")) 
-    return [p.strip() for p in paragraphs if p.strip()]  
+async def resolve_document(file, document_id):
+    """Return the store ID for a request that sent either the file or a /upload/ document ID."""
+    if document_id:
+        if document_id not in document_store:
+            raise KeyError(f"Unknown document id: {document_id}. Please upload the file again.")
+        return document_id
+    if file is None:
+        raise ValueError("Either a file or a document_id is required.")
+    return await store_upload(file, os.path.splitext(file.filename)[1])
+
+async def store_upload(file, suffix):
+    """Read the upload into the document store and return its ID."""
+    with metrics.span("upload_io"):
+        data = await file.read()
+        # Hashing and any spill to disk it triggers stay off the event loop.
+        return await run_in_threadpool(document_store.put, data, suffix, filename=file.filename)
 
 def combine_full_document(paragraphs):
     """Combine all paragraphs into a single string for full-text prompt."""
     return "\n\n".join(paragraphs)
 
+async def prepare_content(doc_id, paragraphs, usage):
+    """Full text for short papers, a shared map-reduce digest for long ones; see chunking.py."""
+    with metrics.span("prepare_content"):
+        content, info = await prepare_review_content(
+            engine, paragraphs, combine_full_document(paragraphs), DIGEST_PROMPT, doc_hash=doc_id, usage=usage
+        )
+    usage.update({key: value for key, value in info.items() if key != "review_hash"})
+    return content, info["review_hash"]
 
+def report_usage(usage):
+    print(f"Review usage: mode={usage['mode']}, prompt_mode={usage['prompt_mode']}, "
+          f"document_tokens={usage['document_tokens']}, chunks={usage['chunks']}, calls={usage['calls']}, "
+          f"tokens_sent={usage['tokens_sent']}, cached_tokens={usage.get('cached_tokens', 0)}, "
+          f"uncached_tokens={usage.get('uncached_tokens', 0)}, completion_tokens={usage.get('completion_tokens', 0)}")
 
-def generate_review(section,content):
-    prompt_template = PROMPTS[section]
-    return call_openai_chat_api(content,prompt_template)
-
-def generate_section_review(content):
-    prompt = PROMPTS["Section"]
-    return call_openai_chat_api(content,prompt)
-
-def generate_overall_review(content):
-    prompt = PROMPTS["Overall"]
-    return call_openai_chat_api(content,prompt)
+def resolve_prompt_mode(prompt_mode):
+    """"separate" runs one call per criterion, "combined" a single structured-output call."""
+    prompt_mode = prompt_mode or REVIEW_PROMPT_MODE
+    if prompt_mode not in ("separate", "combined"):
+        raise ValueError(f"Unknown prompt mode: {prompt_mode}")
+    return prompt_mode
 
 
 
 @app.post("/upload/")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), preview: bool = True):
+    """Store the upload and return it as a PDF, with its document ID in `X-Document-Id`.
+
+    With `preview=false` only `{"document_id": ...}` is returned.
+    """
     try:
         print(f"Received file: {file.filename}, type: {file.content_type}")
 
         if file.content_type == "application/pdf":
             print("Processing a PDF file.")
-            pdf_stream = BytesIO(await file.read())
-            uploaded_files_cache[file.filename] = {"pdf_stream": pdf_stream}
-            return StreamingResponse(pdf_stream, media_type="application/pdf")
+            doc_id = await store_upload(file, ".pdf")
+            pdf_id = doc_id
 
-        elif file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+        elif file.content_type == WORD_CONTENT_TYPE:
             print("Processing a Word file.")
-            pdf_stream = await convert_word_to_pdf(file)
-            uploaded_files_cache[file.filename] = {"pdf_stream": pdf_stream}
-            return StreamingResponse(pdf_stream, media_type="application/pdf")
+            doc_id = await store_upload(file, ".docx")
+            pdf_id = (await run_in_threadpool(document_store.meta, doc_id)).get("pdf_id")
+            if pdf_id not in document_store:
+                word_data = await run_in_threadpool(document_store.read, doc_id)
+                pdf_data = await convert_word_to_pdf(word_data, file.filename)
+                pdf_id = await run_in_threadpool(document_store.put, pdf_data, ".pdf", filename=file.filename)
+                await run_in_threadpool(document_store.update_meta, doc_id, pdf_id=pdf_id)
 
         else:
             print("Unsupported file type.")
             return JSONResponse(content={"error": "Unsupported file type"}, status_code=400)
 
+        headers = {"X-Document-Id": doc_id}
+        if not preview:
+            return JSONResponse(content={"document_id": doc_id}, headers=headers)
+        return StreamingResponse(document_store.iter_chunks(pdf_id), media_type="application/pdf", headers=headers)
+
+    except ConversionQueueFull as e:
+        print(f"Conversion queue full: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=503, headers={"Retry-After": "5"})
+
     except Exception as e:
         print(f"Error during file upload: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
@@ -147,38 +199,45 @@ async def upload_file(file: UploadFile = File(...)):
 
 
 @app.post("/generate-response/")
-async def generate_response(file: UploadFile = File(...)):
+async def generate_response(file: UploadFile = File(None), document_id: str = Form(None),
+                            prompt_mode: str = Form(None)):
     try:
-        print(f"Processing file for OpenAI response: {file.filename}, type: {file.content_type}")
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
-            tmp_file.write(await file.read())
-            tmp_file_path = tmp_file.name
+        try:
+            prompt_mode = resolve_prompt_mode(prompt_mode)
+            doc_id = await resolve_document(file, document_id)
+        except KeyError as e:
+            return JSONResponse(content={"error": str(e.args[0])}, status_code=404)
+        except ValueError as e:
+            return JSONResponse(content={"error": str(e)}, status_code=400)
+        print(f"Processing document for OpenAI response: {doc_id}")
 
         print("Loading document...")
-        paragraphs = load_document(tmp_file_path)
-        os.remove(tmp_file_path) 
+        paragraphs = await load_document_cached(doc_id)
 
         print("Combining full document content...")
-        content = combine_full_document(paragraphs)
+        usage = {"calls": 0, "tokens_sent": 0, "prompt_mode": prompt_mode}
+        content, review_hash = await prepare_content(doc_id, paragraphs, usage)
 
-        print("\nGenerating criteria review...")
+        if prompt_mode == "combined":
+            print("\nGenerating all reviews in one call...")
+            results = await engine.run_combined(content, PROMPTS, doc_hash=review_hash, usage=usage)
+        else:
+            print("\nGenerating all reviews concurrently...")
+            results = await engine.run_reviews(content, PROMPTS, doc_hash=review_hash, usage=usage)
+        report_usage(usage)
         reviews = {
-            "Novelty": generate_review("Novelty",content),
-            "Significance": generate_review("Significance",content),
-            "Soundness": generate_review("Soundness",content)
+            "Novelty": results["Novelty"],
+            "Significance": results["Significance"],
+            "Soundness": results["Soundness"]
         }
-
-        print("\nGenerating Section review...")
-        section_review = generate_section_review(content)
-
-        print("\nGenerating overall assessment...")
-        overall_review = generate_overall_review(content)
+        section_review = results["Section"]
+        overall_review = results["Overall"]
 
         response_json = {
             "criteria": reviews,
             "section_review": section_review,
-            "overall_review": overall_review
+            "overall_review": overall_review,
+            "usage": usage
         }
 
         print("Generated OpenAI response successfully.")
@@ -188,32 +247,133 @@ async def generate_response(file: UploadFile = File(...)):
         print(f"Error during response generation: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 
+@app.post("/generate-response/stream/")
+async def generate_response_stream(file: UploadFile = File(None), document_id: str = Form(None),
+                                   prompt_mode: str = Form(None)):
+    """Server-sent events variant of /generate-response/.
 
-async def convert_word_to_pdf(file: UploadFile):
+    Emits `delta` events with token text, one `section` event per criterion as
+    soon as it is complete, then `done` (or `error`). In combined prompt mode
+    there are no `delta` events; all sections arrive once the single call ends.
+    """
     try:
-        print(f"Converting Word to PDF: {file.filename}")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_file:
-            tmp_file.write(await file.read())
-            tmp_file_path = tmp_file.name
+        prompt_mode = resolve_prompt_mode(prompt_mode)
+        doc_id = await resolve_document(file, document_id)
+    except KeyError as e:
+        return JSONResponse(content={"error": str(e.args[0])}, status_code=404)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    print(f"Streaming OpenAI response for document: {doc_id}")
+
+    async def events():
+        try:
+            paragraphs = await load_document_cached(doc_id)
+            usage = {"calls": 0, "tokens_sent": 0, "prompt_mode": prompt_mode}
+            content, review_hash = await prepare_content(doc_id, paragraphs, usage)
+            if prompt_mode == "combined":
+                results = await engine.run_combined(content, PROMPTS, doc_hash=review_hash, usage=usage)
+                for name, text in results.items():
+                    yield sse_event("section", {"section": name, "content": text})
+            else:
+                async for kind, name, text in engine.stream_reviews(content, PROMPTS, doc_hash=review_hash,
+                                                                    usage=usage):
+                    if kind == "delta":
+                        yield sse_event("delta", {"section": name, "delta": text})
+                    else:
+                        yield sse_event("section", {"section": name, "content": text})
+            report_usage(usage)
+            yield sse_event("done", {"usage": usage})
+            print("Streamed OpenAI response successfully.")
+
+        except Exception as e:
+            print(f"Error during streamed response generation: {e}")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/batch/")
+async def create_batch(file: UploadFile = File(...), mode: str = Form("local")):
+    """Start a batch review of every .pdf/.docx in an uploaded zip file."""
+    try:
+        print(f"Received batch archive: {file.filename}, mode: {mode}")
+
+        def save_and_create_job():
+            with tempfile.NamedTemporaryFile(suffix=".zip") as tmp_file:
+                shutil.copyfileobj(file.file, tmp_file)
+                tmp_file.flush()
+                return batch_manager.create_job(tmp_file.name, mode)
+
+        # Copying and unpacking an archive of many papers is blocking file I/O.
+        job = await run_in_threadpool(save_and_create_job)
+        batch_manager.start(job["id"])
+        return JSONResponse(content=batch_manager.status(job["id"]), status_code=202)
 
-        pdf_file_path = f"{tmp_file_path}.pdf"
-        process = Popen(["unoconv", "-f", "pdf", "-o", pdf_file_path, tmp_file_path], stdout=PIPE, stderr=PIPE)
-        stdout, stderr = process.communicate()
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    except Exception as e:
+        print(f"Error creating batch job: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
 
-        if process.returncode != 0:
-            raise Exception(f"Unoconv error: {stderr.decode('utf-8')}")
 
-        with open(pdf_file_path, "rb") as pdf_file:
-            pdf_data = pdf_file.read()
+@app.get("/batch/{job_id}")
+def batch_status(job_id: str):
+    try:
+        return batch_manager.status(job_id)
+    except KeyError as e:
+        return JSONResponse(content={"error": str(e.args[0])}, status_code=404)
+
+
+@app.get("/batch/{job_id}/results")
+def batch_results(job_id: str):
+    try:
+        status = batch_manager.status(job_id)
+    except KeyError as e:
+        return JSONResponse(content={"error": str(e.args[0])}, status_code=404)
+    # "partial" jobs (and "failed" ones that got as far as writing results) still have a results file.
+    path = batch_manager.results_path(job_id)
+    if status["status"] not in FINISHED or not os.path.exists(path):
+        return JSONResponse(content={"error": f"Batch job is {status['status']}"}, status_code=409)
+    return FileResponse(path, media_type="application/x-ndjson",
+                        filename=f"batch-{job_id}-results.jsonl")
+
 
-        os.remove(tmp_file_path)
-        os.remove(pdf_file_path)
-        print(f"PDF conversion successful: {pdf_file_path}")
-        return BytesIO(pdf_data)
+@app.get("/cache/stats")
+def cache_stats():
+    if review_cache is None:
+        return {"backend": None, "documents": document_store.stats()}
+    return {**review_cache.stats(), "documents": document_store.stats()}
+
+
+@app.get("/conversion/stats")
+def conversion_stats():
+    return conversion_service.stats()
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint: request and per-stage latency histograms, token and cost counters."""
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+async def convert_word_to_pdf(data, filename):
+    try:
+        print(f"Converting Word to PDF: {filename}")
+        with metrics.span("conversion"):
+            pdf_data = await conversion_service.convert(data)
+        print(f"PDF conversion successful: {filename}")
+        return pdf_data
+
+    except ConversionQueueFull:
+        raise
 
     except Exception as e:
         print(f"Error converting Word to PDF: {e}")
         raise Exception(f"Failed to convert Word document to PDF: {e}")
-
-
@@ -0,0 +1,131 @@
+"""Per-stage timings and token counters, exported to Prometheus and a JSON log line.
+
+`span(stage)` times a block into the `peerpolish_stage_seconds` histogram and
+into the trace of the HTTP request it runs under. `RequestMetricsMiddleware`
+opens that trace and prints it as one JSON line when the response has been
+sent (after the last byte, for streaming responses).
+"""
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+METRICS_LOG_REQUESTS = os.getenv("METRICS_LOG_REQUESTS", "1") == "1"
+# USD per million tokens: uncached input, cached input, output (gpt-4o list prices).
+TOKEN_PRICES = {
+    "uncached": float(os.getenv("PRICE_INPUT_PER_M", 2.50)),
+    "cached": float(os.getenv("PRICE_CACHED_INPUT_PER_M", 1.25)),
+    "completion": float(os.getenv("PRICE_OUTPUT_PER_M", 10.00)),
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+REQUEST_SECONDS = Histogram("peerpolish_request_seconds", "HTTP request latency, until the last byte is sent",
+                            ["handler", "method", "status"], buckets=LATENCY_BUCKETS)
+STAGE_SECONDS = Histogram("peerpolish_stage_seconds", "Time spent in one processing stage",
+                          ["stage", "criterion"], buckets=LATENCY_BUCKETS)
+TOKENS = Counter("peerpolish_tokens", "Tokens reported by the OpenAI API", ["criterion", "kind"])
+COST_USD = Counter("peerpolish_cost_usd", "Estimated OpenAI cost in USD", ["criterion"])
+
+_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+def estimate_cost(uncached_tokens, cached_tokens, completion_tokens):
+    return (uncached_tokens * TOKEN_PRICES["uncached"] + cached_tokens * TOKEN_PRICES["cached"]
+            + completion_tokens * TOKEN_PRICES["completion"]) / 1e6
+
+
+@contextmanager
+def span(stage, criterion=""):
+    """Time the enclosed block as `stage`; failures are recorded with `"error": true` in the log."""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage, criterion).observe(elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            entry = {"stage": stage, "ms": round(elapsed * 1000, 1)}
+            if criterion:
+                entry["criterion"] = criterion
+            if error:
+                entry["error"] = True
+            trace["spans"].append(entry)
+
+
+def record_tokens(criterion, prompt_tokens, cached_tokens, completion_tokens):
+    """Count one completion's usage under `criterion` and add it to the current request's trace."""
+    uncached_tokens = prompt_tokens - cached_tokens
+    cost = estimate_cost(uncached_tokens, cached_tokens, completion_tokens)
+    for kind, value in (("cached", cached_tokens), ("uncached", uncached_tokens), ("completion", completion_tokens)):
+        TOKENS.labels(criterion, kind).inc(value)
+    COST_USD.labels(criterion).inc(cost)
+
+    trace = _trace.get()
+    if trace is not None:
+        totals = trace["tokens"].setdefault(criterion, {"cached": 0, "uncached": 0, "completion": 0})
+        totals["cached"] += cached_tokens
+        totals["uncached"] += uncached_tokens
+        totals["completion"] += completion_tokens
+        trace["cost_usd"] += cost
+
+
+def render_metrics():
+    """Prometheus exposition text and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware: one trace per HTTP request, observed and logged once the response is complete."""
+
+    def __init__(self, app, log=METRICS_LOG_REQUESTS):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = {"spans": [], "tokens": {}, "cost_usd": 0.0}
+        token = _trace.set(trace)
+        start = time.perf_counter()
+        status = 500
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            elapsed = time.perf_counter() - start
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            REQUEST_SECONDS.labels(handler, scope["method"], str(status)).observe(elapsed)
+            if self.log and scope["path"] != "/metrics":
+                print(json.dumps({"event": "request", "method": scope["method"], "path": scope["path"],
+                                  "handler": handler, "status": status, "ms": round(elapsed * 1000, 1),
+                                  "spans": trace["spans"], "tokens": trace["tokens"],
+                                  "cost_usd": round(trace["cost_usd"], 6)}), flush=True)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+            _trace.reset(token)
@@ -0,0 +1,149 @@
+"""Local mock of the parts of the OpenAI HTTP API the backend uses.
+
+Implements chat completions (plain and streaming), file upload/download and
+the Batch API, with a configurable latency. Run it and point the backend at it:
+
+    uvicorn mock_openai:app --port 8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock uvicorn main:app
+
+or mount it in-process with `httpx.ASGITransport(app=mock_openai.app)`.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+MOCK_LATENCY = float(os.getenv("MOCK_OPENAI_LATENCY", 0.05))
+MOCK_RESPONSE = os.getenv("MOCK_OPENAI_RESPONSE", '{"criteria": [], "section_review": []}')
+
+app = FastAPI()
+files = {}
+batches = {}
+# System prompts already prefilled, to report cached_tokens like provider prompt caching.
+cached_prefixes = set()
+
+
+def _usage(messages, text, cached_prefix=False):
+    prompt_tokens = sum(len(message["content"]) // 4 + 4 for message in messages) + 3
+    prefix_tokens = len(messages[0]["content"]) // 4
+    cached_tokens = prefix_tokens // 128 * 128 if cached_prefix and prefix_tokens >= 1024 else 0
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+            "total_tokens": prompt_tokens + len(text) // 4,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+
+def _response_text(body):
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        fields = response_format["json_schema"]["schema"]["properties"]
+        return json.dumps({name: MOCK_RESPONSE for name in fields})
+    return MOCK_RESPONSE
+
+
+def _completion(body, cached_prefix=False):
+    text = _response_text(body)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": text}}],
+        "usage": _usage(body["messages"], text, cached_prefix),
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prefix = body["messages"][0]["content"]
+    cached_prefix = prefix in cached_prefixes
+    await asyncio.sleep(MOCK_LATENCY)
+    cached_prefixes.add(prefix)
+    if not body.get("stream"):
+        return _completion(body, cached_prefix)
+
+    text = _response_text(body)
+
+    async def chunks():
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body["model"]}
+        for start in range(0, len(text), 16):
+            chunk = dict(base, choices=[{"index": 0, "delta": {"content": text[start:start + 16]},
+                                         "finish_reason": None}])
+            yield f"data: {json.dumps(chunk)}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = dict(base, choices=[], usage=_usage(body["messages"], text, cached_prefix))
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def _file_object(file_id):
+    entry = files[file_id]
+    return {"id": file_id, "object": "file", "bytes": len(entry["content"]), "created_at": entry["created_at"],
+            "filename": entry["filename"], "purpose": entry["purpose"], "status": "processed"}
+
+
+@app.post("/v1/files")
+async def create_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    file_id = f"file-{uuid.uuid4().hex}"
+    files[file_id] = {"content": await file.read(), "filename": file.filename, "purpose": purpose,
+                      "created_at": int(time.time())}
+    return _file_object(file_id)
+
+
+@app.get("/v1/files/{file_id}/content")
+def file_content(file_id: str):
+    if file_id not in files:
+        return JSONResponse({"error": {"message": "No such file"}}, status_code=404)
+    return PlainTextResponse(files[file_id]["content"])
+
+
+def _run_batch(batch):
+    lines = []
+    for raw in files[batch["input_file_id"]]["content"].decode("utf-8").splitlines():
+        if not raw.strip():
+            continue
+        request = json.loads(raw)
+        lines.append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": _completion(request["body"])},
+            "error": None,
+        }))
+    output_id = f"file-{uuid.uuid4().hex}"
+    files[output_id] = {"content": "\n".join(lines).encode("utf-8"), "filename": "output.jsonl",
+                        "purpose": "batch_output", "created_at": int(time.time())}
+    batch.update(status="completed", output_file_id=output_id, completed_at=int(time.time()),
+                 request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+
+
+@app.post("/v1/batches")
+async def create_batch(request: Request):
+    body = await request.json()
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    batches[batch_id] = {
+        "id": batch_id, "object": "batch", "endpoint": body["endpoint"], "errors": None,
+        "input_file_id": body["input_file_id"], "completion_window": body["completion_window"],
+        "status": "in_progress", "output_file_id": None, "error_file_id": None,
+        "created_at": int(time.time()), "completed_at": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0}, "metadata": body.get("metadata"),
+    }
+    return batches[batch_id]
+
+
+@app.get("/v1/batches/{batch_id}")
+def retrieve_batch(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        return JSONResponse({"error": {"message": "No such batch"}}, status_code=404)
+    # Reported as in progress on creation, finished on the first poll.
+    if batch["status"] == "in_progress":
+        _run_batch(batch)
+    return batch
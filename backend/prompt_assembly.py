@@ -0,0 +1,66 @@
+"""Chat message layouts for the review prompts.
+
+Every request starts with the same system message holding the document, so
+the five criteria share a byte-identical prefix that the provider can serve
+from its prompt cache. Only the trailing user turn differs per criterion.
+"""
+import json
+import os
+
+REVIEW_PROMPT_MODE = os.getenv("REVIEW_PROMPT_MODE", "separate")
+# Providers only cache prompts from this many tokens up.
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", 1024))
+
+DOCUMENT_PREFIX = "Here is the background content for evaluation:\n\n"
+
+COMBINED_INSTRUCTIONS = (
+    "Carry out each of the following review tasks independently on the background content. "
+    "Return a JSON object with one field per task. Each field must contain that task's complete "
+    "output as a string, formatted exactly as the task itself requests (for example, a JSON "
+    "document serialized as a string when the task asks for JSON)."
+)
+
+
+def build_shared_prefix(content):
+    """The document system message; identical for every criterion of one document."""
+    return {"role": "system", "content": f"{DOCUMENT_PREFIX}{content}"}
+
+
+def build_messages(content, prompt):
+    """Build the chat messages for one criterion: shared document prefix, then the template."""
+    return [
+        build_shared_prefix(content),
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+
+def build_combined_prompt(prompts):
+    """One user turn asking for every entry of `prompts` ({name: template}) at once."""
+    tasks = "\n\n".join(f"=== Task: {name} ===\n{template}" for name, template in prompts.items())
+    return f"{COMBINED_INSTRUCTIONS}\n\n{tasks}"
+
+
+def combined_response_format(prompts):
+    """Structured-output schema with one required string field per criterion."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "peer_review",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {name: {"type": "string"} for name in prompts},
+                "required": list(prompts),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def parse_combined_response(text, prompts):
+    """Split a combined structured response back into {name: text}."""
+    data = json.loads(text)
+    return {name: data.get(name) for name in prompts}
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+REVIEW_CACHE_BACKEND = os.getenv("REVIEW_CACHE_BACKEND", "sqlite")
+REVIEW_CACHE_PATH = os.getenv("REVIEW_CACHE_PATH", "review_cache.sqlite3")
+REVIEW_CACHE_MAX_ENTRIES = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", 5000))
+REVIEW_CACHE_TTL = float(os.getenv("REVIEW_CACHE_TTL", 7 * 24 * 3600))
+# SQLite: access times are written once this many hits are pending, and the
+# size/TTL prune runs once every this many writes.
+REVIEW_CACHE_TOUCH_BATCH = int(os.getenv("REVIEW_CACHE_TOUCH_BATCH", 64))
+REVIEW_CACHE_PRUNE_EVERY = int(os.getenv("REVIEW_CACHE_PRUNE_EVERY", 100))
+
+
+def sha256_hex(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class MemoryLRUBackend:
+    """In-process LRU with size and TTL eviction."""
+
+    def __init__(self, max_entries=REVIEW_CACHE_MAX_ENTRIES, ttl=REVIEW_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created = entry
+            if self.ttl and time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, entries):
+        now = time.time()
+        with self._lock:
+            for key, value in entries.items():
+                self._entries[key] = (value, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def flush(self):
+        pass
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk cache shared across restarts (and workers on the same host).
+
+    Hits only record their access time in memory; the times are written in
+    one batch with the next `set` or once `touch_batch` are pending. Expired
+    and least recently used rows are pruned every `prune_every` writes, so
+    the table may briefly hold that many rows more than `max_entries`.
+    """
+
+    def __init__(self, path=REVIEW_CACHE_PATH, max_entries=REVIEW_CACHE_MAX_ENTRIES, ttl=REVIEW_CACHE_TTL,
+                 touch_batch=REVIEW_CACHE_TOUCH_BATCH, prune_every=REVIEW_CACHE_PRUNE_EVERY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_batch = touch_batch
+        self.prune_every = prune_every
+        self._touched = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                # Left for the next prune.
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_batch:
+                self._write_touched()
+                self._conn.commit()
+            return value
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, entries):
+        """Insert or replace several rows in one transaction."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                [(key, value, now, now) for key, value in entries.items()]
+            )
+            for key in entries:
+                self._touched.pop(key, None)
+            self._write_touched()
+            self._writes += len(entries)
+            if self._writes >= self.prune_every:
+                self._writes = 0
+                self._prune(now)
+            self._conn.commit()
+
+    def flush(self):
+        """Write pending access times now."""
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+
+    def _write_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE cache SET accessed = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def _prune(self, now):
+        if self.ttl:
+            self._conn.execute("DELETE FROM cache WHERE created < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ReviewCache:
+    """Content-addressed cache for parsed documents and per-criterion reviews.
+
+    Review keys combine the upload's SHA-256, the template's SHA-256, the model
+    and the temperature, so editing one template only invalidates that criterion.
+
+    Lookups may hit the disk; async callers run them in a worker thread.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def review_key(doc_hash, prompt, model, temperature):
+        return f"review:{doc_hash}:{sha256_hex(prompt)}:{model}:{temperature}"
+
+    @staticmethod
+    def document_key(doc_hash, extractor_version):
+        return f"document:{doc_hash}:{extractor_version}"
+
+    def get(self, key):
+        raw = self.backend.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def get_many(self, keys):
+        """Return {key: value or None} for every key."""
+        return {key: self.get(key) for key in keys}
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, entries):
+        """Store every non-None value of {key: value}."""
+        entries = {key: json.dumps(value) for key, value in entries.items() if value is not None}
+        if entries:
+            self.backend.set_many(entries)
+
+    def flush(self):
+        self.backend.flush()
+
+    def stats(self):
+        return {"backend": type(self.backend).__name__, "entries": len(self.backend),
+                "hits": self.hits, "misses": self.misses}
+
+
+def create_review_cache(backend=REVIEW_CACHE_BACKEND):
+    """Build the cache selected by REVIEW_CACHE_BACKEND ("sqlite", "memory" or "none")."""
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return ReviewCache(MemoryLRUBackend())
+    if backend == "sqlite":
+        return ReviewCache(SQLiteBackend())
+    raise ValueError(f"Unknown review cache backend: {backend}")
@@ -0,0 +1,311 @@
+import asyncio
+import os
+import random
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+import metrics
+from prompt_assembly import (
+    PROMPT_CACHE_MIN_TOKENS,
+    build_combined_prompt,
+    build_messages,
+    combined_response_format,
+    parse_combined_response,
+)
+from tokens import count_message_tokens, count_tokens
+
+REVIEW_MODEL = os.getenv("REVIEW_MODEL", "gpt-4o")
+REVIEW_CONCURRENCY = int(os.getenv("REVIEW_CONCURRENCY", 5))
+REVIEW_TIMEOUT = float(os.getenv("REVIEW_TIMEOUT", 180))
+REVIEW_MAX_RETRIES = int(os.getenv("REVIEW_MAX_RETRIES", 3))
+REVIEW_BACKOFF = float(os.getenv("REVIEW_BACKOFF", 1.0))
+# Hold back the other criteria until the first one has produced a token, so
+# the shared document prefix is already in the provider's prompt cache. This
+# trades latency (one time-to-first-token) for cheaper input tokens; off until
+# `bench_prompt_modes.py --modes separate separate-warm` shows it pays off.
+REVIEW_WARM_PREFIX = os.getenv("REVIEW_WARM_PREFIX", "0") == "1"
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    APITimeoutError,
+    APIConnectionError,
+    RateLimitError,
+    InternalServerError,
+)
+
+
+def _record_request(usage, messages):
+    if usage is not None:
+        usage["calls"] = usage.get("calls", 0) + 1
+        usage["tokens_sent"] = usage.get("tokens_sent", 0) + count_message_tokens(messages)
+
+
+def _record_usage(usage, reported, criterion):
+    """Add the API-reported `usage` of one completion, split into cached and uncached prompt tokens.
+
+    The counts also feed the per-criterion Prometheus counters.
+    """
+    if not reported:
+        return
+    if not isinstance(reported, dict):
+        reported = reported.model_dump()
+    prompt_tokens = reported.get("prompt_tokens") or 0
+    cached_tokens = (reported.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    completion_tokens = reported.get("completion_tokens") or 0
+    metrics.record_tokens(criterion, prompt_tokens, cached_tokens, completion_tokens)
+    if usage is None:
+        return
+    for key, value in (("prompt_tokens", prompt_tokens), ("cached_tokens", cached_tokens),
+                       ("uncached_tokens", prompt_tokens - cached_tokens),
+                       ("completion_tokens", completion_tokens)):
+        usage[key] = usage.get(key, 0) + value
+
+
+class ReviewEngine:
+    """Fan the review prompts out concurrently against an async chat client.
+
+    `client` is anything exposing `await client.chat.completions.create(...)`,
+    i.e. `openai.AsyncOpenAI` or `stub_openai.StubAsyncClient` for benchmarks. With a
+    `ReviewCache`, criteria already reviewed for the same document are skipped.
+    With `warm_prefix`, the first criterion of a long document is started
+    alone and the rest follow once it streams its first token.
+    """
+
+    def __init__(self, client, model=REVIEW_MODEL, temperature=0, concurrency=REVIEW_CONCURRENCY,
+                 timeout=REVIEW_TIMEOUT, max_retries=REVIEW_MAX_RETRIES, backoff=REVIEW_BACKOFF,
+                 cache=None, warm_prefix=REVIEW_WARM_PREFIX):
+        self.client = client
+        self.warm_prefix = warm_prefix
+        self.cache = cache
+        self.model = model
+        self.temperature = temperature
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _retrying(self, call):
+        """Run `call()` under the concurrency limit, backing off exponentially on transient errors."""
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    return await call()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                print(f"Retrying API call in {delay:.1f}s after error: {e!r}")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def _create(self, messages, **kwargs):
+        return asyncio.wait_for(
+            self.client.chat.completions.create(
+                messages=messages,
+                model=self.model,
+                temperature=self.temperature,
+                **kwargs
+            ),
+            timeout=self.timeout
+        )
+
+    async def review(self, content, prompt, usage=None, criterion="review", **kwargs):
+        """Run one prompt against the document; returns the text or None on failure.
+
+        If given, the `usage` dict accumulates `calls` and `tokens_sent` for this
+        request, plus the prompt (cached/uncached) and completion tokens the API reports.
+        Each attempt is timed as an `openai` span labelled with `criterion`.
+        """
+        messages = build_messages(content, prompt)
+
+        async def call():
+            _record_request(usage, messages)
+            with metrics.span("openai", criterion):
+                return await self._create(messages, **kwargs)
+
+        try:
+            chat_completion = await self._retrying(call)
+            chat_completion_dict = chat_completion.model_dump()
+            _record_usage(usage, chat_completion_dict.get("usage"), criterion)
+            return chat_completion_dict["choices"][0]["message"]["content"]
+
+        except Exception as e:
+            print(f"Error during API call: {e!r}")
+            return None
+
+    async def review_stream(self, content, prompt, on_delta, usage=None, criterion="review"):
+        """Like `review`, but streams tokens and awaits `on_delta(text)` for each one.
+
+        A call is only retried if it fails before its first token was forwarded.
+        """
+        messages = build_messages(content, prompt)
+
+        async def call():
+            with metrics.span("openai", criterion):
+                return await stream_once()
+
+        async def stream_once():
+            parts = []
+            stream = None
+            _record_request(usage, messages)
+            # Closed on every exit (timeouts, cancellation when the SSE client goes away)
+            # so the HTTP response does not keep a pooled connection until garbage collection.
+            try:
+                with metrics.span("openai_first_token", criterion):
+                    stream = await self._create(messages, stream=True, stream_options={"include_usage": True})
+                    iterator = stream.__aiter__()
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        return ""
+                while True:
+                    _record_usage(usage, getattr(chunk, "usage", None), criterion)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        await on_delta(delta)
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        return "".join(parts)
+                    except RETRYABLE_ERRORS as e:
+                        if parts:
+                            raise RuntimeError(f"Stream interrupted after {len(parts)} chunks: {e!r}") from e
+                        raise
+            finally:
+                if stream is not None:
+                    await stream.close()
+
+        try:
+            return await self._retrying(call)
+
+        except Exception as e:
+            print(f"Error during streaming API call: {e!r}")
+            return None
+
+    async def _cached_results(self, prompts, doc_hash):
+        """Look every criterion up in the cache; returns ({name: text or None}, {name: key})."""
+        if self.cache is None or not doc_hash:
+            return {}, {}
+        keys = {name: self.cache.review_key(doc_hash, prompt, self.model, self.temperature)
+                for name, prompt in prompts.items()}
+        found = await asyncio.to_thread(self.cache.get_many, list(keys.values()))
+        return {name: found[key] for name, key in keys.items()}, keys
+
+    async def run_reviews(self, content, prompts, doc_hash=None, usage=None):
+        """Run every entry of `prompts` ({name: template}) at once and return {name: text}.
+
+        `doc_hash` is the SHA-256 of the uploaded bytes; it enables the result cache.
+        """
+        results, keys = await self._cached_results(prompts, doc_hash)
+
+        pending = [name for name in prompts if results.get(name) is None]
+        warmed = self._prefix_gate(content, pending)
+
+        async def review_one(name):
+            if name == pending[0] and warmed is not None:
+                async def on_delta(delta):
+                    warmed.set()
+                try:
+                    return await self.review_stream(content, prompts[name], on_delta, usage, criterion=name)
+                finally:
+                    warmed.set()
+            if warmed is not None:
+                await warmed.wait()
+            return await self.review(content, prompts[name], usage, criterion=name)
+
+        fresh = await asyncio.gather(*(review_one(name) for name in pending))
+        results.update(zip(pending, fresh))
+        if keys:
+            await self._store({keys[name]: results[name] for name in pending})
+
+        return {name: results[name] for name in prompts}
+
+    async def _store(self, entries):
+        """Write {key: result} to the cache; a failing cache only costs the next request a fresh review."""
+        try:
+            await asyncio.to_thread(self.cache.set_many, entries)
+        except Exception as e:
+            print(f"Error writing review cache: {e!r}")
+
+    def _prefix_gate(self, content, pending):
+        """Event the followers wait on while the first call warms the prompt cache, or None."""
+        if self.warm_prefix and len(pending) > 1 and count_tokens(content) >= PROMPT_CACHE_MIN_TOKENS:
+            return asyncio.Event()
+        return None
+
+    async def run_combined(self, content, prompts, doc_hash=None, usage=None):
+        """Ask for every criterion in one structured-output call and return {name: text}."""
+        prompt = build_combined_prompt(prompts)
+        key = None
+        if self.cache is not None and doc_hash:
+            key = self.cache.review_key(doc_hash, prompt, self.model, self.temperature)
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return cached
+
+        text = await self.review(content, prompt, usage, criterion="combined",
+                                 response_format=combined_response_format(prompts))
+        try:
+            results = parse_combined_response(text, prompts) if text is not None else None
+        except ValueError as e:
+            print(f"Error parsing combined review: {e!r}")
+            results = None
+        if results is None:
+            return {name: None for name in prompts}
+        if key is not None:
+            await self._store({key: results})
+        return results
+
+    async def stream_reviews(self, content, prompts, doc_hash=None, usage=None):
+        """Async generator over review events as the criteria complete.
+
+        Yields `("delta", name, text)` for each streamed token and
+        `("section", name, full_text_or_None)` once per criterion. If a
+        criterion's task fails unexpectedly, its exception is raised here.
+        """
+        results, keys = await self._cached_results(prompts, doc_hash)
+        queue = asyncio.Queue()
+        pending = [name for name in prompts if results.get(name) is None]
+        warmed = self._prefix_gate(content, pending)
+
+        async def stream_one(name):
+            leader = warmed is not None and name == pending[0]
+            if warmed is not None and not leader:
+                await warmed.wait()
+
+            async def on_delta(delta):
+                if leader:
+                    warmed.set()
+                await queue.put(("delta", name, delta))
+
+            try:
+                text = await self.review_stream(content, prompts[name], on_delta, usage, criterion=name)
+                if name in keys:
+                    await self._store({keys[name]: text})
+            except Exception as e:
+                await queue.put(("error", name, e))
+                return
+            finally:
+                if leader:
+                    warmed.set()
+            await queue.put(("section", name, text))
+
+        for name in prompts:
+            if results.get(name) is not None:
+                yield ("section", name, results[name])
+
+        tasks = [asyncio.create_task(stream_one(name)) for name in pending]
+        try:
+            remaining = len(pending)
+            while remaining:
+                event = await queue.get()
+                if event[0] == "error":
+                    raise event[2]
+                if event[0] == "section":
+                    remaining -= 1
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
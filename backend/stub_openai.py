@@ -0,0 +1,112 @@
+"""In-process stand-in for `openai.AsyncOpenAI` used by tests, benchmarks and load tests.
+
+Only `chat.completions.create` (plain and streaming) is implemented. Calls
+sleep `latency` seconds and report token usage like the API, including
+cached prompt tokens once a long system prompt has been seen. For the HTTP
+API, Files and Batch endpoints, see mock_openai.py.
+"""
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+
+from prompt_assembly import PROMPT_CACHE_MIN_TOKENS
+from tokens import count_message_tokens, count_tokens
+
+
+class _StubCompletion:
+    def __init__(self, text, usage):
+        self._text = text
+        self._usage = usage
+
+    def model_dump(self):
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": self._text}}],
+                "usage": self._usage}
+
+
+class _StubChunk:
+    def __init__(self, text, usage=None):
+        self.choices = [SimpleNamespace(index=0, delta=SimpleNamespace(content=text))] if text else []
+        self.usage = usage
+
+
+class _StubStream:
+    """Async iterator over stub chunks with `close()`, like `openai.AsyncStream`."""
+
+    def __init__(self, owner, text, chunk_delay, usage):
+        self.owner = owner
+        self.text = text
+        self.chunk_delay = chunk_delay
+        self.usage = usage
+        owner.open_streams += 1
+
+    async def __aiter__(self):
+        for i in range(0, len(self.text), 8):
+            await asyncio.sleep(self.chunk_delay)
+            yield _StubChunk(self.text[i:i + 8])
+        yield _StubChunk(None, self.usage)
+
+    async def close(self):
+        if self.owner is not None:
+            self.owner.open_streams -= 1
+            self.owner = None
+
+
+class _StubCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    async def create(self, messages, model, temperature=0, stream=False, response_format=None, **kwargs):
+        owner = self.owner
+        owner.calls += 1
+        if owner.errors:
+            raise owner.errors.pop(0)
+        owner.in_flight += 1
+        owner.max_in_flight = max(owner.max_in_flight, owner.in_flight)
+        # Like provider prompt caching: the prefix is cached once a request's prefill is done.
+        prefix = messages[0]["content"]
+        prefix_tokens = count_tokens(prefix)
+        cached = prefix in owner.cached_prefixes and prefix_tokens >= PROMPT_CACHE_MIN_TOKENS
+        try:
+            await asyncio.sleep(owner.latency + random.uniform(0, owner.jitter))
+        finally:
+            owner.in_flight -= 1
+        owner.cached_prefixes.add(prefix)
+
+        text = owner.response_text
+        if response_format is not None:
+            fields = response_format["json_schema"]["schema"]["properties"]
+            text = json.dumps({name: owner.response_text for name in fields})
+        prompt_tokens = count_message_tokens(messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": count_tokens(text),
+                 "prompt_tokens_details": {"cached_tokens": prefix_tokens // 128 * 128 if cached else 0}}
+        if stream:
+            return _StubStream(owner, text, owner.chunk_delay, usage)
+        return _StubCompletion(text, usage)
+
+
+class _StubChat:
+    def __init__(self, owner):
+        self.completions = _StubCompletions(owner)
+
+
+class StubAsyncClient:
+    """Fake async OpenAI client that sleeps instead of calling the API.
+
+    `errors` are raised, in order, by the first calls; `calls`, `max_in_flight`
+    and `open_streams` record what the client saw.
+    """
+
+    def __init__(self, latency=1.0, jitter=0.0, response_text="{}", chunk_delay=0.0, errors=()):
+        self.latency = latency
+        self.jitter = jitter
+        self.response_text = response_text
+        self.chunk_delay = chunk_delay
+        self.errors = list(errors)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.open_streams = 0
+        self.cached_prefixes = set()
+        self.chat = _StubChat(self)
+
@@ -0,0 +1,149 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import httpx
+import pytest
+from docx import Document
+from openai import AsyncOpenAI
+
+import mock_openai
+from batch_jobs import BatchManager
+from review_engine import ReviewEngine
+
+PROMPTS = {"Novelty": "Assess novelty.", "Overall": "Summarize."}
+
+
+@pytest.fixture(autouse=True)
+def fast_mock(monkeypatch):
+    monkeypatch.setattr(mock_openai, "MOCK_LATENCY", 0)
+
+
+@pytest.fixture
+def submission(tmp_path):
+    """A zip of two papers with the same file name in different folders."""
+    path = tmp_path / "papers.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        for folder in ("x", "y"):
+            document = Document()
+            document.add_heading("Introduction", level=1)
+            document.add_paragraph(f"Paper {folder} studies the effect of reviews on revisions.")
+            buffer = io.BytesIO()
+            document.save(buffer)
+            archive.writestr(f"{folder}/a.docx", buffer.getvalue())
+    return str(path)
+
+
+def make_manager(directory):
+    client = AsyncOpenAI(api_key="mock", base_url="http://mock/v1", max_retries=0,
+                         http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=mock_openai.app)))
+    engine = ReviewEngine(client, concurrency=2, max_retries=0)
+    return BatchManager(client, engine, PROMPTS, "Condense.", directory=str(directory), poll_interval=0,
+                        requests_per_minute=6000)
+
+
+async def resume(manager, retry_failed=False):
+    """Resume like the server does on start-up; returns how many jobs were restarted."""
+    tasks = manager.resume_all(retry_failed)
+    await asyncio.gather(*tasks)
+    return len(tasks)
+
+
+def read_results(manager, job_id):
+    with open(manager.results_path(job_id), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("mode", ["local", "openai"])
+def test_job_reviews_every_paper(tmp_path, submission, mode):
+    async def run():
+        manager = make_manager(tmp_path / "jobs")
+        job = manager.create_job(submission, mode)
+        await manager.run(job["id"])
+        return manager, job["id"]
+
+    manager, job_id = asyncio.run(run())
+    status = manager.status(job_id)
+    assert status["status"] == "completed"
+    assert status["completed_requests"] == status["total_requests"] == 4
+    assert len(status["openai_batch_ids"]) == (1 if mode == "openai" else 0)
+
+    rows = read_results(manager, job_id)
+    assert [row["paper"] for row in rows] == ["x/a.docx", "y/a.docx"]
+    assert all(row["overall_review"] == mock_openai.MOCK_RESPONSE for row in rows)
+    assert all(row["criteria"]["Novelty"] == mock_openai.MOCK_RESPONSE for row in rows)
+
+
+def test_openai_job_resumes_after_restart(tmp_path, submission):
+    async def crash():
+        manager = make_manager(tmp_path / "jobs")
+        job = manager.create_job(submission, "openai")
+
+        async def killed(batch_id):
+            raise asyncio.CancelledError()
+
+        manager.client.batches.retrieve = killed
+        with pytest.raises(asyncio.CancelledError):
+            await manager.run(job["id"])
+        return job["id"]
+
+    job_id = asyncio.run(crash())
+    submitted = len(mock_openai.batches)
+
+    async def restart():
+        manager = make_manager(tmp_path / "jobs")
+        assert manager.status(job_id)["status"] == "running"
+        assert await resume(manager) == 1
+        return manager
+
+    manager = asyncio.run(restart())
+    # The batch submitted before the restart is polled again, not submitted twice.
+    assert len(mock_openai.batches) == submitted
+    assert manager.status(job_id)["status"] == "completed"
+    assert all(row["overall_review"] for row in read_results(manager, job_id))
+
+
+def test_retry_failed_runs_only_missing_reviews(tmp_path, submission):
+    calls = []
+    failing = {"Overall"}
+
+    def flaky(manager):
+        review = manager.engine.review
+
+        async def flaky_review(content, prompt, usage=None, criterion="review", **kwargs):
+            calls.append(criterion)
+            if criterion in failing:
+                return None
+            return await review(content, prompt, usage, criterion=criterion, **kwargs)
+
+        manager.engine.review = flaky_review
+        return manager
+
+    async def first():
+        manager = flaky(make_manager(tmp_path / "jobs"))
+        job = manager.create_job(submission, "local")
+        await manager.run(job["id"])
+        return manager, job["id"]
+
+    manager, job_id = asyncio.run(first())
+    status = manager.status(job_id)
+    assert status["status"] == "partial"
+    assert (status["completed_requests"], status["failed_requests"]) == (2, 2)
+    assert [row["overall_review"] for row in read_results(manager, job_id)] == [None, None]
+
+    # Finished jobs are only picked up again with retry_failed.
+    assert asyncio.run(resume(manager)) == 0
+
+    failing.clear()
+    calls.clear()
+
+    async def retry():
+        manager = flaky(make_manager(tmp_path / "jobs"))
+        assert await resume(manager, retry_failed=True) == 1
+        return manager
+
+    manager = asyncio.run(retry())
+    assert sorted(calls) == ["Overall", "Overall"]
+    assert manager.status(job_id)["status"] == "completed"
+    assert all(row["overall_review"] for row in read_results(manager, job_id))
@@ -0,0 +1,94 @@
+import asyncio
+
+from chunking import prepare_review_content, split_into_chunks
+from extraction import HEADING_PREFIX
+from review_cache import MemoryLRUBackend, ReviewCache
+from review_engine import ReviewEngine
+from stub_openai import StubAsyncClient
+from tokens import count_tokens
+
+
+def paper(sections=6, paragraphs=8, words=40):
+    result = []
+    for s in range(sections):
+        result.append(f"{HEADING_PREFIX}Section {s}")
+        for p in range(paragraphs):
+            result.append(" ".join(f"s{s}p{p}w{w}" for w in range(words)))
+    return result
+
+
+def test_every_chunk_fits_the_budget():
+    for budget in (50, 200, 1000):
+        chunks = split_into_chunks(paper(), budget)
+        assert chunks
+        assert all(count_tokens(chunk) <= budget for chunk in chunks)
+
+
+def test_small_document_is_one_chunk():
+    paragraphs = paper(sections=2, paragraphs=2, words=5)
+    assert split_into_chunks(paragraphs, budget=1000) == ["\n\n".join(paragraphs)]
+
+
+def test_sections_are_not_split_when_they_fit():
+    paragraphs = paper(sections=4, paragraphs=2, words=10)
+    section_tokens = count_tokens("\n\n".join(paragraphs[:3]))
+    chunks = split_into_chunks(paragraphs, budget=section_tokens + 5)
+    assert len(chunks) == 4
+    assert all(chunk.startswith(f"{HEADING_PREFIX}Section ") for chunk in chunks)
+
+
+def test_continuation_chunks_repeat_the_heading():
+    paragraphs = paper(sections=1, paragraphs=10, words=40)
+    chunks = split_into_chunks(paragraphs, budget=200)
+    assert len(chunks) > 1
+    assert all(chunk.startswith(f"{HEADING_PREFIX}Section 0\n\n") for chunk in chunks)
+
+
+def test_oversized_paragraph_is_split_on_words():
+    long_paragraph = " ".join(f"word{i}" for i in range(2000))
+    chunks = split_into_chunks([long_paragraph], budget=100)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == long_paragraph.split()
+
+
+def test_oversized_paragraph_under_a_heading_fits_with_the_heading():
+    paragraphs = [f"{HEADING_PREFIX}Results", " ".join(f"word{i}" for i in range(2000))]
+    chunks = split_into_chunks(paragraphs, budget=100)
+    assert len(chunks) > 1
+    assert all(chunk.startswith(f"{HEADING_PREFIX}Results\n\n") for chunk in chunks)
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+
+
+def test_long_document_is_condensed_once_per_chunk():
+    engine = ReviewEngine(StubAsyncClient(latency=0, response_text="notes"),
+                          cache=ReviewCache(MemoryLRUBackend()))
+    paragraphs = paper()
+    full_text = "\n\n".join(paragraphs)
+    chunks = split_into_chunks(paragraphs, budget=300)
+
+    usage = {}
+    content, info = asyncio.run(prepare_review_content(engine, paragraphs, full_text, "Condense.", doc_hash="doc",
+                                                       usage=usage, mode="auto", full_text_limit=500, budget=300))
+    assert info["mode"] == "map_reduce"
+    assert info["chunks"] == len(chunks) == usage["calls"]
+    assert content.count("### Part ") == len(chunks)
+
+    # The digest is cached: a second pass makes no calls and reviews key on the same hash.
+    usage = {}
+    again, again_info = asyncio.run(prepare_review_content(engine, paragraphs, full_text, "Condense.",
+                                                           doc_hash="doc", usage=usage, mode="auto",
+                                                           full_text_limit=500, budget=300))
+    assert again == content
+    assert again_info["review_hash"] == info["review_hash"]
+    assert usage.get("calls", 0) == 0
+
+
+def test_short_document_is_sent_in_full():
+    engine = ReviewEngine(StubAsyncClient(latency=0))
+    paragraphs = paper(sections=1, paragraphs=1, words=5)
+    full_text = "\n\n".join(paragraphs)
+    content, info = asyncio.run(prepare_review_content(engine, paragraphs, full_text, "Condense.", doc_hash="doc"))
+    assert content == full_text
+    assert info["mode"] == "full"
+    assert info["review_hash"] == "doc"
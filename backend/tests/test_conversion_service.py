@@ -0,0 +1,116 @@
+import asyncio
+import os
+import socket
+import sys
+
+import pytest
+
+from conversion_service import ConversionQueueFull, ConversionService
+
+FAKE_CONVERTER = [sys.executable, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                               "fake_unoconv.py")]
+
+
+@pytest.fixture(autouse=True)
+def fast_converter(monkeypatch):
+    monkeypatch.setenv("FAKE_UNOCONV_COLD", "0")
+    monkeypatch.setenv("FAKE_UNOCONV_WARM", "0")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run(test, **kwargs):
+    """Run `test(service)` against a started service and stop its listeners afterwards."""
+    async def main():
+        service = ConversionService(command=FAKE_CONVERTER, base_port=free_port(), **{"workers": 1, **kwargs})
+        await service.start()
+        try:
+            return await test(service)
+        finally:
+            await service.stop()
+            for listener in service.listeners:
+                assert not listener.alive
+
+    return asyncio.run(asyncio.wait_for(main(), 60))
+
+
+def test_first_job_waits_for_a_booting_listener(monkeypatch):
+    monkeypatch.setenv("FAKE_UNOCONV_BOOT", "0.5")
+
+    async def test(service):
+        assert service.pooled
+        assert (await service.convert(b"doc")).startswith(b"%PDF")
+        assert service.stats()["restarts"] == 0
+
+    run(test)
+
+
+def test_crashed_listener_is_restarted():
+    async def test(service):
+        listener = service.listeners[0]
+        first = listener.process.pid
+        listener.process.kill()
+        await listener.process.wait()
+
+        assert (await service.convert(b"doc")).startswith(b"%PDF")
+        assert listener.restarts == 1
+        assert listener.alive and listener.process.pid != first
+
+    run(test)
+
+
+def test_wedged_listener_is_killed_and_job_falls_back_to_one_shot(monkeypatch):
+    monkeypatch.setenv("FAKE_UNOCONV_WARM", "30")
+
+    async def test(service):
+        listener = service.listeners[0]
+        first = listener.process
+        assert (await service.convert(b"doc")).startswith(b"%PDF")
+        # Killed after the first timeout, restarted for the retry, killed again, then one-shot.
+        assert first.returncode is not None
+        assert listener.restarts == 1
+        assert not listener.alive
+        assert service.converted == 1
+
+    run(test, timeout=0.5)
+
+
+def test_one_shot_when_no_listener_can_start():
+    async def test(service):
+        assert not service.pooled
+        assert (await service.convert(b"doc")).startswith(b"%PDF")
+
+    async def main():
+        service = ConversionService(command=["no-such-unoconv"], workers=1)
+        await service.start()
+        service.command = FAKE_CONVERTER
+        return await test(service)
+
+    asyncio.run(main())
+
+
+def test_full_queue_is_rejected(monkeypatch):
+    monkeypatch.setenv("FAKE_UNOCONV_WARM", "1")
+
+    async def test(service):
+        results = await asyncio.gather(*(service.convert(b"doc %d" % i) for i in range(4)),
+                                       return_exceptions=True)
+        assert any(isinstance(result, ConversionQueueFull) for result in results)
+        assert any(isinstance(result, bytes) for result in results)
+
+    run(test, queue_size=1, queue_timeout=0.1)
+
+
+def test_identical_inputs_share_one_conversion(monkeypatch):
+    monkeypatch.setenv("FAKE_UNOCONV_WARM", "0.3")
+
+    async def test(service):
+        results = await asyncio.gather(*(service.convert(b"same doc") for _ in range(3)))
+        assert len(set(results)) == 1
+        assert (service.converted, service.deduplicated) == (1, 2)
+
+    run(test)
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from document_store import DocumentStore
+
+
+def test_identical_bytes_share_one_id(tmp_path):
+    store = DocumentStore(directory=str(tmp_path))
+    first = store.put(b"paper", ".pdf", filename="a.pdf")
+    second = store.put(b"paper", ".pdf", filename="b.pdf")
+    assert first == second
+    assert store.meta(first)["filename"] == "b.pdf"
+    assert store.put(b"other paper", ".pdf") != first
+
+
+def test_least_recently_used_spills_to_disk(tmp_path):
+    store = DocumentStore(memory_bytes=10, directory=str(tmp_path))
+    old = store.put(b"a" * 6, ".pdf")
+    new = store.put(b"b" * 6, ".pdf")
+
+    assert store.stats() == {"documents": 2, "in_memory": 1, "memory_bytes": 6, "disk_bytes": 6}
+    assert os.listdir(store.directory) == [f"{old}.pdf"]
+    assert store.read(old) == b"a" * 6
+    assert b"".join(store.iter_chunks(old, chunk_size=4)) == b"a" * 6
+    assert store.read(new) == b"b" * 6
+
+
+def test_disk_budget_drops_oldest(tmp_path):
+    store = DocumentStore(memory_bytes=0, disk_bytes=10, directory=str(tmp_path))
+    old = store.put(b"a" * 6, ".pdf")
+    new = store.put(b"b" * 6, ".pdf")
+
+    assert old not in store
+    assert new in store
+    assert store.stats()["disk_bytes"] == 6
+    assert os.listdir(store.directory) == [f"{new}.pdf"]
+    with pytest.raises(KeyError):
+        store.read(old)
+
+
+def test_pinned_document_is_not_evicted(tmp_path):
+    store = DocumentStore(memory_bytes=0, disk_bytes=10, directory=str(tmp_path))
+    pinned = store.put(b"a" * 6, ".pdf")
+    with store.pinned_path(pinned) as path:
+        store.put(b"b" * 6, ".pdf")
+        assert pinned in store
+        with open(path, "rb") as f:
+            assert f.read() == b"a" * 6
+    # Released: the next eviction pass can drop it.
+    store.put(b"c" * 6, ".pdf")
+    assert pinned not in store
+    assert not os.path.exists(path)
+
+
+def test_stale_spill_directories_are_removed(tmp_path):
+    stale = tmp_path / "999999999"
+    stale.mkdir()
+    (stale / "old.pdf").write_bytes(b"x")
+    (tmp_path / "loose.pdf").write_bytes(b"x")
+
+    store = DocumentStore(directory=str(tmp_path))
+    assert os.listdir(tmp_path) == [os.path.basename(store.directory)]
@@ -0,0 +1,68 @@
+from extraction import HEADING_PREFIX, is_heading, iter_paragraphs
+
+
+def test_numbered_heading():
+    assert is_heading("1. Introduction")
+    assert is_heading("3.2 Data Collection")
+    assert is_heading("IV. Findings")
+    assert is_heading("Results:")
+
+
+def test_numbered_sentence_is_not_a_heading():
+    assert not is_heading("2. The participants were recruited from three")
+    assert not is_heading("2. We argue that")
+    assert not is_heading("2. Methods and")
+
+
+def test_line_continued_in_lowercase_is_not_a_heading():
+    assert is_heading("2. Sample Selection")
+    assert not is_heading("2. Sample Selection", "criteria were applied to every firm.")
+
+
+def test_wrapped_numbered_sentence_stays_one_paragraph():
+    lines = ["2. The participants were recruited from three", "universities in the region and were paid."]
+    assert list(iter_paragraphs(lines)) == [
+        "2. The participants were recruited from three universities in the region and were paid."
+    ]
+
+
+def test_wrapped_across_page_number():
+    lines = ["3. Sample Selection", "12", "criteria were applied to every firm in the panel."]
+    assert list(iter_paragraphs(lines)) == ["3. Sample Selection criteria were applied to every firm in the panel."]
+
+
+def test_headings_split_paragraphs():
+    lines = ["1. Introduction", "Peer review is slow and the", "process is opaque.", "",
+             "2. Method", "We surveyed two hundred firms."]
+    assert list(iter_paragraphs(lines)) == [
+        f"{HEADING_PREFIX}1. Introduction",
+        "Peer review is slow and the process is opaque.",
+        f"{HEADING_PREFIX}2. Method",
+        "We surveyed two hundred firms.",
+    ]
+
+
+def test_hyphenated_line_break_is_rejoined():
+    lines = ["The results were statis-", "tically significant across all cohorts."]
+    assert list(iter_paragraphs(lines)) == ["The results were statistically significant across all cohorts."]
+
+
+def test_cjk_headings():
+    assert is_heading("摘要")
+    assert is_heading("参考文献：")
+    assert is_heading("1 引言")
+    assert is_heading("一、研究方法")
+    assert not is_heading("30年来数字平台迅速发展")
+    assert not is_heading("1 我们招募了参与者，并且")
+
+
+def test_cjk_lines_split_at_sentence_ends():
+    lines = ["摘要", "本文研究数字平台对组织能力的影响，并且讨论了其在", "不同行业中的差异。", "样本很小。",
+             "1 引言", "同行评审耗时较长。"]
+    assert list(iter_paragraphs(lines)) == [
+        f"{HEADING_PREFIX}摘要",
+        "本文研究数字平台对组织能力的影响，并且讨论了其在不同行业中的差异。",
+        "样本很小。",
+        f"{HEADING_PREFIX}1 引言",
+        "同行评审耗时较长。",
+    ]
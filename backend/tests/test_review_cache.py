@@ -0,0 +1,59 @@
+import asyncio
+
+from review_cache import MemoryLRUBackend, ReviewCache, SQLiteBackend
+from review_engine import ReviewEngine
+from stub_openai import StubAsyncClient
+
+PROMPTS = {"Novelty": "Assess novelty.", "Soundness": "Assess soundness.", "Overall": "Summarize."}
+
+
+def test_editing_one_template_only_changes_its_key():
+    before = {name: ReviewCache.review_key("doc", prompt, "gpt-4o", 0) for name, prompt in PROMPTS.items()}
+    edited = dict(PROMPTS, Soundness="Assess soundness and validity.")
+    after = {name: ReviewCache.review_key("doc", prompt, "gpt-4o", 0) for name, prompt in edited.items()}
+    assert [name for name in PROMPTS if before[name] != after[name]] == ["Soundness"]
+
+
+def test_key_depends_on_document_model_and_temperature():
+    key = ReviewCache.review_key("doc", "prompt", "gpt-4o", 0)
+    assert ReviewCache.review_key("other", "prompt", "gpt-4o", 0) != key
+    assert ReviewCache.review_key("doc", "prompt", "gpt-4o-mini", 0) != key
+    assert ReviewCache.review_key("doc", "prompt", "gpt-4o", 0.7) != key
+
+
+def test_edited_template_is_the_only_criterion_reviewed_again():
+    client = StubAsyncClient(latency=0, response_text="review")
+    engine = ReviewEngine(client, cache=ReviewCache(MemoryLRUBackend()))
+    asyncio.run(engine.run_reviews("text", PROMPTS, doc_hash="doc"))
+    assert client.calls == len(PROMPTS)
+
+    edited = dict(PROMPTS, Soundness="Assess soundness and validity.")
+    results = asyncio.run(engine.run_reviews("text", edited, doc_hash="doc"))
+    assert client.calls == len(PROMPTS) + 1
+    assert results == {name: "review" for name in PROMPTS}
+
+
+def test_sqlite_hits_do_not_write_until_batched(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), touch_batch=3)
+    backend.set_many({"a": "1", "b": "2"})
+    assert backend.get("a") == "1"
+    assert backend.get("b") == "2"
+    assert not backend._conn.in_transaction
+    assert set(backend._touched) == {"a", "b"}
+
+    backend.get("a")
+    backend.get("missing")
+    assert set(backend._touched) == {"a", "b"}
+    backend.flush()
+    assert backend._touched == {}
+
+
+def test_sqlite_prunes_least_recently_used(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_entries=2, prune_every=1)
+    backend.set("old", "1")
+    backend.set("used", "2")
+    backend.get("used")
+    backend.set("new", "3")
+    assert len(backend) == 2
+    assert backend.get("old") is None
+    assert backend.get("used") == "2"
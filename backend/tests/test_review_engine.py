@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from review_cache import MemoryLRUBackend, ReviewCache
+from review_engine import ReviewEngine
+from stub_openai import StubAsyncClient
+
+PROMPTS = {"Novelty": "Assess novelty.", "Soundness": "Assess soundness.", "Overall": "Summarize."}
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def connection_error():
+    return APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def test_concurrency_limit():
+    client = StubAsyncClient(latency=0.02)
+    engine = ReviewEngine(client, concurrency=2)
+
+    async def run():
+        return await asyncio.gather(*(engine.review("text", f"prompt {i}") for i in range(8)))
+
+    assert asyncio.run(run()) == ["{}"] * 8
+    assert client.calls == 8
+    assert client.max_in_flight == 2
+
+
+def test_concurrency_limit_applies_to_streams():
+    client = StubAsyncClient(latency=0.02, response_text="x" * 40, chunk_delay=0.001)
+    engine = ReviewEngine(client, concurrency=2)
+    asyncio.run(collect(engine.stream_reviews("text", PROMPTS)))
+    assert client.max_in_flight <= 2
+
+
+def test_retryable_error_is_retried_with_backoff():
+    client = StubAsyncClient(latency=0, response_text="review", errors=[connection_error(), connection_error()])
+    engine = ReviewEngine(client, max_retries=2, backoff=0.01)
+    start = time.perf_counter()
+    assert asyncio.run(engine.review("text", "prompt")) == "review"
+    assert client.calls == 3
+    # Backoff doubles: at least 0.01s + 0.02s.
+    assert time.perf_counter() - start >= 0.03
+
+
+def test_gives_up_after_max_retries():
+    client = StubAsyncClient(latency=0, errors=[connection_error()] * 4)
+    engine = ReviewEngine(client, max_retries=2, backoff=0)
+    assert asyncio.run(engine.review("text", "prompt")) is None
+    assert client.calls == 3
+
+
+def test_non_retryable_error_is_not_retried():
+    client = StubAsyncClient(latency=0, errors=[ValueError("bad request")])
+    engine = ReviewEngine(client, max_retries=2, backoff=0)
+    assert asyncio.run(engine.review("text", "prompt")) is None
+    assert client.calls == 1
+
+
+def test_timed_out_call_returns_none():
+    client = StubAsyncClient(latency=5)
+    engine = ReviewEngine(client, timeout=0.05, max_retries=1, backoff=0)
+    start = time.perf_counter()
+    assert asyncio.run(engine.review("text", "prompt")) is None
+    assert client.calls == 2
+    assert client.in_flight == 0
+    assert time.perf_counter() - start < 1
+
+
+def test_stream_reviews_yields_one_section_per_criterion():
+    client = StubAsyncClient(latency=0, response_text="a streamed review")
+    engine = ReviewEngine(client)
+    events = asyncio.run(collect(engine.stream_reviews("text", PROMPTS)))
+
+    sections = {name: text for kind, name, text in events if kind == "section"}
+    assert sections == {name: "a streamed review" for name in PROMPTS}
+    deltas = "".join(text for kind, name, text in events if kind == "delta" and name == "Overall")
+    assert deltas == "a streamed review"
+    assert client.open_streams == 0
+
+
+def test_failing_cache_write_does_not_hang_the_stream():
+    class BrokenCache(ReviewCache):
+        def set_many(self, entries):
+            raise OSError("disk I/O error")
+
+    engine = ReviewEngine(StubAsyncClient(latency=0, response_text="review"), cache=BrokenCache(MemoryLRUBackend()))
+    events = asyncio.run(asyncio.wait_for(collect(engine.stream_reviews("text", PROMPTS, doc_hash="doc")), 5))
+    assert sorted(name for kind, name, _ in events if kind == "section") == sorted(PROMPTS)
+
+
+def test_failing_task_is_raised_instead_of_hanging():
+    engine = ReviewEngine(StubAsyncClient(latency=0))
+
+    async def broken(*args, **kwargs):
+        raise ValueError("boom")
+
+    engine.review_stream = broken
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(asyncio.wait_for(collect(engine.stream_reviews("text", PROMPTS)), 5))
+
+
+def test_stalled_stream_times_out_and_is_closed():
+    client = StubAsyncClient(latency=0, response_text="x" * 64, chunk_delay=1.0)
+    engine = ReviewEngine(client, timeout=0.05, max_retries=0)
+
+    async def on_delta(delta):
+        pass
+
+    assert asyncio.run(engine.review_stream("text", "prompt", on_delta)) is None
+    assert client.open_streams == 0
+
+
+def test_disconnect_closes_every_stream():
+    client = StubAsyncClient(latency=0, response_text="x" * 800, chunk_delay=0.01)
+    engine = ReviewEngine(client)
+
+    async def disconnect_after_first_delta():
+        events = engine.stream_reviews("text", PROMPTS)
+        async for kind, _, _ in events:
+            if kind == "delta":
+                break
+        # What StreamingResponse does when the client goes away.
+        await events.aclose()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(disconnect_after_first_delta())
+    assert client.calls == len(PROMPTS)
+    assert client.open_streams == 0
@@ -0,0 +1,36 @@
+import os
+from functools import lru_cache
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+except Exception as e:  # Listed in requirements.txt; the estimate below only keeps a broken install usable.
+    print(f"tiktoken unavailable ({e!r}); using a conservative token estimate.")
+    _encoding = None
+
+
+def estimate_tokens(text):
+    """Upper-bound style estimate: ASCII runs at ~4 chars per token, any other character as one token.
+
+    CJK and other non-Latin scripts encode at roughly one token per character,
+    so a flat chars/4 would undercount them three- to fourfold.
+    """
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+@lru_cache(maxsize=64)
+def count_tokens(text):
+    """Token count of `text` for the gpt-4o family (estimated conservatively without tiktoken)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def count_message_tokens(messages):
+    """Approximate prompt tokens of a chat request, including per-message overhead."""
+    return sum(count_tokens(message["content"]) + 4 for message in messages) + 3
@@ -1,5 +1,4 @@
-from PyPDF2 import PdfReader
-from docx import Document
+from extraction import iter_docx_paragraphs, iter_pdf_paragraphs
 import os
 
 async def process_file(file):
@@ -12,15 +11,7 @@ async def process_file(file):
         return "Unsupported file type."
 
 def process_pdf(file):
-    reader = PdfReader(file.file)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
+    return "\n\n".join(iter_pdf_paragraphs(file.file))
 
 def process_docx(file):
-    document = Document(file.file)
-    text = ""
-    for paragraph in document.paragraphs:
-        text += paragraph.text + "\n"
-    return text
+    return "".join(f"{paragraph}\n" for paragraph in iter_docx_paragraphs(file.file))
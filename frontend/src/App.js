@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import LeftPanel from "./components/LeftPanel";
 import RightPanel from "./components/RightPanel";
 import Header from "./components/Header";
@@ -11,6 +11,9 @@ import { initGA, trackPageView } from "./ga";
 
 function App() {
   const [selectedFile, setSelectedFile] = useState(null); 
+  const [documentId, setDocumentId] = useState(null);
+  // Latest selection, read when an upload finishes so a stale response is ignored.
+  const selectedFileRef = useRef(null);
   const [pdfUrl, setPdfUrl] = useState(null); 
   const [highlightedReferences, setHighlightedReferences] = useState([]); 
   const [activeTab, setActiveTab] = useState("overall");
@@ -30,7 +33,18 @@ function App() {
 
   const handleFileSelect = (file) => {
     console.log("File selected in LeftPanel:", file); 
+    selectedFileRef.current = file;
     setSelectedFile(file); 
+    setDocumentId(null);
+  };
+
+  // Returns false (and ignores the ID) when `file` is no longer the selected file.
+  const handleDocumentUploaded = (file, id) => {
+    if (file !== selectedFileRef.current) {
+      return false;
+    }
+    setDocumentId(id);
+    return true;
   };
 
   const handlePdfPreview = (url) => {
@@ -61,6 +75,7 @@ function App() {
       <div class="panel-container">
         <LeftPanel
           onFileSelect={handleFileSelect}
+          onDocumentUploaded={handleDocumentUploaded}
           onPdfPreview={handlePdfPreview}
           pdfUrl={pdfUrl}
           highlightedReferences={highlightedReferences} 
@@ -69,6 +84,7 @@ function App() {
         />
         <RightPanel
           file={selectedFile}
+          documentId={documentId}
           sectionData={sectionData}
           criteriaData={criteriaData}
           onSetHighlightedReferences={handleSetHighlightedReferences} 
@@ -5,14 +5,14 @@ import { zoomPlugin } from "@react-pdf-viewer/zoom";
 import "@react-pdf-viewer/core/lib/styles/index.css";
 import "@react-pdf-viewer/highlight/lib/styles/index.css";
 import "@react-pdf-viewer/zoom/lib/styles/index.css";
-import axios from "axios";
+import { uploadFile, registerDocument } from "../services/api";
 import * as pdfjsLib from "pdfjs-dist";
 
 import { trackEvent } from "../ga"; 
 
 pdfjsLib.GlobalWorkerOptions.workerSrc = `https://unpkg.com/pdfjs-dist@3.11.174/build/pdf.worker.min.js`;
 
-function LeftPanel({ onFileSelect, onPdfPreview, pdfUrl, highlightedReferences, jumpTarget,activeTab }) {
+function LeftPanel({ onFileSelect, onDocumentUploaded, onPdfPreview, pdfUrl, highlightedReferences, jumpTarget,activeTab }) {
   const [selectedFile, setSelectedFile] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -220,23 +220,28 @@ function LeftPanel({ onFileSelect, onPdfPreview, pdfUrl, highlightedReferences,
         timestamp: previewStartTime
       });
 
+      const file = selectedFile;
+      registerDocument(file)
+        .then((documentId) => onDocumentUploaded(file, documentId))
+        .catch((err) => console.error("Failed to register document:", err));
+
       return;
     }
 
     if (selectedFile.type === "application/vnd.openxmlformats-officedocument.wordprocessingml.document") {
+      const file = selectedFile;
       setLoading(true);
       try {
-        const formData = new FormData();
-        formData.append("file", selectedFile);
-        const response = await axios.post("http://localhost:8000/upload/", formData, {
-          headers: { "Content-Type": "multipart/form-data" },
-          responseType: "blob",
-        });
-        const pdfBlobUrl = URL.createObjectURL(response.data);
+        const { pdfUrl: pdfBlobUrl, documentId } = await uploadFile(file);
+        if (!onDocumentUploaded(file, documentId)) {
+          // Another file was selected while this one was converting.
+          URL.revokeObjectURL(pdfBlobUrl);
+          return;
+        }
 
         const previewStartTime = performance.now();
         onPdfPreview(pdfBlobUrl);
-        trackEvent("PDF Preview", "Start", selectedFile.name, {
+        trackEvent("PDF Preview", "Start", file.name, {
           timestamp: previewStartTime
         });
         
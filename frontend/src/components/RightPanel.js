@@ -1,10 +1,53 @@
 import React, { useState } from "react";
-import { generateAIResponse } from "../services/api";
+import { streamAIResponse } from "../services/api";
 import { Oval } from 'react-loader-spinner';
 
 import { trackEvent } from "../ga";
 
-function RightPanel({ file, onSetHighlightedReferences, onSetActiveTab, onSetData, onJumpToReference }) {
+const CRITERIA_CATEGORIES = ["Novelty", "Significance", "Soundness"];
+
+const parseSectionReview = (rawSectionReview) => {
+  let jsonString = rawSectionReview.trim();
+  const match = jsonString.match(/```json\n([\s\S]*?)```/);
+  if (match && match[1]) {
+    jsonString = match[1];
+  }
+
+  const parsedSectionReview = JSON.parse(jsonString);
+  console.log("✅ Parsed Section Review:", parsedSectionReview);
+  return parsedSectionReview?.section_review || [];
+};
+
+const collectCriteriaReferences = (criteria) => {
+  const criteriaReferences = [];
+  if (!criteria) return criteriaReferences;
+
+  Object.keys(criteria).forEach((categoryName) => {
+    try {
+      const parsedCategory = JSON.parse(criteria[categoryName]);
+      parsedCategory.criteria.forEach((criterion) => {
+        criterion.recommendations.forEach((rec) => {
+          criteriaReferences.push({
+            reference: rec.reference,
+            id: `${categoryName}-${criterion.aspect}-${rec.recommendation.slice(0, 10)}`,
+          });
+        });
+      });
+    } catch (err) {
+      console.error(`Failed to parse ${categoryName}:`, err);
+    }
+  });
+  return criteriaReferences;
+};
+
+const collectSectionReferences = (sectionData) =>
+  sectionData.map((item, index) => ({
+    reference: item.reference,
+    id: `section-${index}`,
+    position: item.position,
+  }));
+
+function RightPanel({ file, documentId, onSetHighlightedReferences, onSetActiveTab, onSetData, onJumpToReference }) {
   const [responses, setResponses] = useState(null);
   const [activeTab, setActiveTab] = useState("overall");
   const [loading, setLoading] = useState(false);
@@ -26,86 +69,85 @@ function RightPanel({ file, onSetHighlightedReferences, onSetActiveTab, onSetDat
 
     trackEvent("Generate Response", "Click", "Start", { file_name: file.name });
 
-    try {
-      const aiResponses = await generateAIResponse(file);
-      console.log("AI Responses received:", aiResponses);
-
-      let parsedSectionReview = null;
-
-      if (!aiResponses.sectionReview) {
-        console.error("❌ sectionReview is missing:", aiResponses.sectionReview);
-        setError("Missing section review in AI response.");
-
-        trackEvent("Generate Response", "Error", "Missing sectionReview", { file_name: file.name });
-
-        return;
-      }
+    // Accumulated locally so every event can publish a consistent snapshot.
+    const criteria = {};
+    let sectionData = null;
+    let overallReview = "";
 
-      console.log("Raw sectionReview:", aiResponses.sectionReview);
+    const orderedCriteria = () => {
+      const ordered = {};
+      CRITERIA_CATEGORIES.filter((name) => name in criteria).forEach((name) => {
+        ordered[name] = criteria[name];
+      });
+      return ordered;
+    };
 
-      let jsonString = aiResponses.sectionReview.trim();
-      const match = jsonString.match(/```json\n([\s\S]*?)```/);
-      if (match && match[1]) {
-        jsonString = match[1];
-      }
+    const publish = () => {
+      setResponses({
+        criteria: orderedCriteria(),
+        sectionReview: sectionData,
+        overallReview,
+      });
+    };
 
-      try {
-        parsedSectionReview = JSON.parse(jsonString);
-        console.log("✅ Parsed Section Review:", parsedSectionReview);
-      } catch (err) {
-        console.error("❌ Failed to parse JSON:", err);
-        setError("Invalid JSON format in AI response.");
+    // Highlights re-scan the whole PDF, so only refresh them when a review completes.
+    const publishHighlights = () => {
+      onSetHighlightedReferences([
+        ...collectSectionReferences(sectionData || []),
+        ...collectCriteriaReferences(orderedCriteria()),
+      ]);
+    };
 
-        trackEvent("Generate Response", "Error", "Invalid JSON Format", { file_name: file.name });
-        return;
+    const handleDelta = (name, delta) => {
+      if (name === "Overall") {
+        overallReview += delta;
+        publish();
       }
+    };
 
-      const sectionData = parsedSectionReview?.section_review || [];
-      if (!Array.isArray(sectionData)) {
-        console.error("❌ section_review is not an array:", sectionData);
-        setError("Invalid section review format.");
+    const handleSection = (name, content) => {
+      console.log(`AI response received for ${name}`);
+
+      if (name === "Overall") {
+        overallReview = content || "";
+      } else if (name === "Section") {
+        if (!content) {
+          console.error("❌ sectionReview is missing:", content);
+          setError("Missing section review in AI response.");
+          trackEvent("Generate Response", "Error", "Missing sectionReview", { file_name: file.name });
+          return;
+        }
 
-        trackEvent("Generate Response", "Error", "Invalid Section Review Format", { file_name: file.name });
-        return;
-      }
+        console.log("Raw sectionReview:", content);
+        try {
+          sectionData = parseSectionReview(content);
+        } catch (err) {
+          console.error("❌ Failed to parse JSON:", err);
+          setError("Invalid JSON format in AI response.");
+          trackEvent("Generate Response", "Error", "Invalid JSON Format", { file_name: file.name });
+          return;
+        }
 
-      const criteriaReferences = [];
-      if (aiResponses.criteria) {
-        Object.keys(aiResponses.criteria).forEach((categoryName) => {
-          try {
-            const parsedCategory = JSON.parse(aiResponses.criteria[categoryName]);
-            parsedCategory.criteria.forEach((criterion) => {
-              criterion.recommendations.forEach((rec) => {
-                criteriaReferences.push({
-                  reference: rec.reference,
-                  id: `${categoryName}-${criterion.aspect}-${rec.recommendation.slice(0, 10)}`,
-                });
-              });
-            });
-          } catch (err) {
-            console.error(`Failed to parse ${categoryName}:`, err);
-          }
-        });
+        if (!Array.isArray(sectionData)) {
+          console.error("❌ section_review is not an array:", sectionData);
+          sectionData = null;
+          setError("Invalid section review format.");
+          trackEvent("Generate Response", "Error", "Invalid Section Review Format", { file_name: file.name });
+          return;
+        }
+      } else if (content) {
+        criteria[name] = content;
       }
+      publish();
+      publishHighlights();
+    };
 
-      setResponses({
-        ...aiResponses,
-        sectionReview: sectionData,
-        criteria: aiResponses.criteria,
-      });
-
-      onSetHighlightedReferences([
-        ...sectionData.map((item, index) => ({
-          reference: item.reference,
-          id: `section-${index}`,
-          position: item.position,
-        })),
-        ...criteriaReferences,
-      ]);
+    try {
+      await streamAIResponse(file, documentId, { onDelta: handleDelta, onSection: handleSection });
 
       trackEvent("Generate Response", "Success", "Generated", {
         file_name: file.name,
-        section_count: sectionData.length,
+        section_count: sectionData ? sectionData.length : 0,
       });
 
     } catch (err) {
@@ -130,30 +172,9 @@ function RightPanel({ file, onSetHighlightedReferences, onSetActiveTab, onSetDat
     onSetActiveTab(tab);
 
     if (tab === "section" && responses?.sectionReview) {
-      const sectionRefs = responses.sectionReview.map((item, index) => ({
-        reference: item.reference,
-        id: `section-${index}`,
-        position: item.position,
-      }));
-      onSetHighlightedReferences(sectionRefs);
+      onSetHighlightedReferences(collectSectionReferences(responses.sectionReview));
     } else if (tab === "criteria" && responses?.criteria) {
-      const criteriaRefs = [];
-      Object.keys(responses.criteria).forEach((categoryName) => {
-        try {
-          const parsedCategory = JSON.parse(responses.criteria[categoryName]);
-          parsedCategory.criteria.forEach((criterion) => {
-            criterion.recommendations.forEach((rec) => {
-              criteriaRefs.push({
-                reference: rec.reference,
-                id: `${categoryName}-${criterion.aspect}-${rec.recommendation.slice(0, 10)}`,
-              });
-            });
-          });
-        } catch (err) {
-          console.error(`Failed to parse ${categoryName}:`, err);
-        }
-      });
-      onSetHighlightedReferences(criteriaRefs);
+      onSetHighlightedReferences(collectCriteriaReferences(responses.criteria));
     } else if (tab === "overall") {
       onSetHighlightedReferences([]);
     }
@@ -399,7 +420,7 @@ const renderOverall = (content) => {
 
 const renderContent = () => {
   if (!responses) {
-    return <p>AI responses will appear here once generated...</p>;
+    return loading || error ? null : <p>AI responses will appear here once generated...</p>;
   }
 
         switch (activeTab) {
@@ -458,11 +479,15 @@ const renderContent = () => {
                   visible={true}
                   ariaLabel='oval-loading'
                 />
-                <span>Loading AI responses, may take a few minutes...</span>
+                <span>
+                  {responses
+                    ? "Generating remaining reviews..."
+                    : "Loading AI responses, may take a few minutes..."}
+                </span>
               </div>
             )}
             {error && <p style={{ color: "red" }}>{error}</p>}
-            {!loading && !error && renderContent()}
+            {renderContent()}
           </div>
         </section>
         );
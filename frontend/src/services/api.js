@@ -18,7 +18,7 @@ export const uploadFile = async (file) => {
 
         const pdfUrl = URL.createObjectURL(pdfBlob);
         console.log("Generated PDF URL:", pdfUrl); 
-        return pdfUrl;
+        return { pdfUrl, documentId: response.headers["x-document-id"] };
 
     } catch (error) {
         console.error("Error uploading file:", error.response?.data || error.message);
@@ -26,11 +26,31 @@ export const uploadFile = async (file) => {
     }
 };
 
-export const generateAIResponse = async (file) => {
-    console.log("Preparing to send API request with file:", file); 
+// Stores the file server-side without sending the PDF back; returns its document ID.
+export const registerDocument = async (file) => {
     const formData = new FormData();
     formData.append("file", file);
 
+    const response = await axios.post(`${API_URL}/upload/?preview=false`, formData, {
+        headers: { "Content-Type": "multipart/form-data" },
+    });
+    return response.data.document_id;
+};
+
+const reviewFormData = (file, documentId) => {
+    const formData = new FormData();
+    if (documentId) {
+        formData.append("document_id", documentId);
+    } else {
+        formData.append("file", file);
+    }
+    return formData;
+};
+
+export const generateAIResponse = async (file, documentId) => {
+    console.log("Preparing to send API request with file:", file); 
+    const formData = reviewFormData(file, documentId);
+
     try {
         const response = await axios.post(`${API_URL}/generate-response/`, formData, {
             headers: { "Content-Type": "multipart/form-data" },
@@ -47,3 +67,60 @@ export const generateAIResponse = async (file) => {
         throw new Error(error.response?.data?.error || "Failed to generate AI response.");
     }
 };
+
+const parseSSEEvent = (rawEvent) => {
+    let event = "message";
+    const dataLines = [];
+    rawEvent.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+            dataLines.push(line.slice(5).trimStart());
+        }
+    });
+    return { event, data: dataLines.length ? JSON.parse(dataLines.join("\n")) : null };
+};
+
+export const streamAIResponse = async (file, documentId, { onDelta, onSection }) => {
+    let response = await fetch(`${API_URL}/generate-response/stream/`, {
+        method: "POST",
+        body: reviewFormData(file, documentId),
+    });
+    if (response.status === 404 && documentId && file) {
+        // The server evicted the stored upload; fall back to sending the file.
+        response = await fetch(`${API_URL}/generate-response/stream/`, {
+            method: "POST",
+            body: reviewFormData(file, null),
+        });
+    }
+    if (!response.ok || !response.body) {
+        throw new Error("Failed to generate AI response.");
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+            const { event, data } = parseSSEEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            boundary = buffer.indexOf("\n\n");
+
+            if (event === "delta") {
+                onDelta?.(data.section, data.delta);
+            } else if (event === "section") {
+                onSection?.(data.section, data.content);
+            } else if (event === "error") {
+                throw new Error(data.error || "Failed to generate AI response.");
+            } else if (event === "done") {
+                return;
+            }
+        }
+    }
+};